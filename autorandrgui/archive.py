@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, tarfile, json, shutil, tempfile, time, sys
+from StringIO import StringIO
+
+""" Version of the archive manifest """
+VERSION = 1
+
+""" The archive member describing the archive, it can not be a profile
+since profiles are directories """
+MANIFEST = "autorandr-gui.json"
+
+""" What to do with a profile that already exists """
+SKIP = "skip"
+OVERWRITE = "overwrite"
+RENAME = "rename"
+POLICIES = (SKIP, OVERWRITE, RENAME)
+
+""" Prefix of the directories profiles are unpacked into """
+STAGING = ".import-"
+
+""" The files of a profile which hold no code. Anything else, like a
+postswitch hook, is only imported when asked for. """
+DATAFILES = ("config", "setup", "comment", "gpuhash")
+
+def main():
+  """ List the profiles of an archive """
+  logging.basicConfig(level=logging.DEBUG)
+  with open(sys.argv[1], "rb") as fp:
+    archive = tarfile.open(fileobj=fp, mode="r|*")
+    for member in archive:
+      print(member.name)
+
+def validname(name):
+  """ Returns true if name can be a profile directory """
+  return bool(name) and name not in (".", "..") and os.sep not in name \
+      and not name.startswith(STAGING)
+
+def export(ardir, names, fp, default=None, compress=False):
+  """ Writes the profiles names from ardir as a tar stream to the file
+  object fp. Only the regular files directly inside a profile are stored.
+  Returns the names of the exported profiles. """
+  mode = "w|"
+  if compress:
+    mode = "w|gz"
+  archive = tarfile.open(fileobj=fp, mode=mode)
+  manifest = json.dumps({ 'version': VERSION, 'profiles': names, \
+      'default': default if default in names else None })
+  info = tarfile.TarInfo(MANIFEST)
+  info.size = len(manifest)
+  info.mtime = time.time()
+  archive.addfile(info, StringIO(manifest))
+  exported = []
+  for name in names:
+    profiledir = os.path.join(ardir, name)
+    try:
+      files = sorted(os.listdir(profiledir))
+    except OSError as e:
+      logging.error(u"Could not read the profile {0}".format(name))
+      continue
+    for filename in files:
+      path = os.path.join(profiledir, filename)
+      if os.path.isfile(path) and not os.path.islink(path):
+        archive.add(path, arcname=name + "/" + filename, recursive=False)
+    exported.append(name)
+  archive.close()
+  return exported
+
+
+class Importer:
+  """ Unpacks the profiles of a tar stream into ardir in one pass. Every
+  profile is first unpacked into a staging directory and moved into place
+  by finish(), so a broken archive leaves no half-written profiles. """
+
+  def __init__(self, ardir, existing, policy=SKIP, hooks=False):
+    """ existing are the names of the profiles already in ardir. Without
+    hooks only the DATAFILES of the profiles are imported, none of them
+    executable. """
+    if policy not in POLICIES:
+      raise ValueError(u"Unknown conflict policy {0}".format(policy))
+    self.ardir = ardir
+    self.hooks = hooks
+    self.taken = set(existing)
+    self.existing = set(existing)
+    self.policy = policy
+    self.default = None
+    self.staged = {}
+    self.skipped = []
+    self.renamed = {}
+    self.staging = None
+
+  def target(self, name):
+    """ Returns the name a profile of the archive is imported as, or None
+    if it is skipped. Decided once per profile. """
+    if name in self.staged:
+      return self.staged[name][0]
+    if name in self.skipped:
+      return None
+    newname = name
+    if name in self.taken:
+      if self.policy == SKIP:
+        logging.info(u"Skipping the existing profile {0}".format(name))
+        self.skipped.append(name)
+        return None
+      if self.policy == RENAME:
+        number = 2
+        while u"{0}-{1}".format(name, number) in self.taken:
+          number += 1
+        newname = u"{0}-{1}".format(name, number)
+        self.renamed[name] = newname
+    self.taken.add(newname)
+    if self.staging is None:
+      self.staging = tempfile.mkdtemp(prefix=STAGING, dir=self.ardir)
+    staged = os.path.join(self.staging, str(len(self.staged)))
+    os.mkdir(staged)
+    self.staged[name] = (newname, staged)
+    return newname
+
+  def read(self, fp):
+    """ Unpacks the profiles of the tar stream fp into the staging area """
+    archive = tarfile.open(fileobj=fp, mode="r|*")
+    for member in archive:
+      if member.name == MANIFEST and member.isfile():
+        try:
+          manifest = json.load(archive.extractfile(member))
+          self.default = manifest.get('default')
+        except (ValueError, AttributeError) as e:
+          logging.error(u"The manifest of the archive is broken")
+        continue
+      parts = member.name.split("/")
+      if len(parts) != 2 or not member.isfile():
+        if not member.isdir():
+          logging.info(u"Ignoring {0} in the archive".format(member.name))
+        continue
+      name, filename = [ i.decode('utf-8') for i in parts ]
+      if not validname(name) or not validname(filename):
+        logging.error(u"Ignoring {0} in the archive".format(member.name))
+        continue
+      if not self.hooks and filename not in DATAFILES:
+        logging.warning(u"Not importing {0}, it may be a hook".format(\
+            member.name.decode('utf-8')))
+        continue
+      if self.target(name) is None:
+        continue
+      staged = self.staged[name][1]
+      with open(os.path.join(staged, filename), "wb") as out:
+        shutil.copyfileobj(archive.extractfile(member), out)
+      mode = 0644
+      if self.hooks:
+        mode = member.mode & 0755
+      os.chmod(os.path.join(staged, filename), mode)
+    archive.close()
+
+  def finish(self):
+    """ Moves the unpacked profiles into place. A replaced profile is moved
+    aside first and put back if its replacement can not be moved in. Returns
+    the names of the imported profiles and of those which replaced existing
+    ones. """
+    imported = []
+    replaced = []
+    try:
+      for name in sorted(self.staged):
+        newname, staged = self.staged[name]
+        profiledir = os.path.join(self.ardir, newname)
+        if newname not in self.existing:
+          os.rename(staged, profiledir)
+          imported.append(newname)
+          continue
+        # Removed with the staging area
+        old = staged + ".old"
+        os.rename(profiledir, old)
+        try:
+          os.rename(staged, profiledir)
+        except OSError as e:
+          os.rename(old, profiledir)
+          raise
+        replaced.append(newname)
+        imported.append(newname)
+    finally:
+      self.abort()
+    return imported, replaced
+
+  def abort(self):
+    """ Removes the staging area """
+    if self.staging is not None:
+      shutil.rmtree(self.staging, True)
+      self.staging = None
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
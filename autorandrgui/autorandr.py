@@ -16,13 +16,15 @@
 # See the Licence for the specific language governing permissions and
 # limitations under the Licence.
 
-import subprocess, logging, os, sys
-import re, fileinput, shutil, codecs
-import hashlib, ConfigParser
+import logging, os, sys
+import re, shutil
+import hashlib, ConfigParser, tarfile
+import detect, profileindex, confstore, probe, gpuid, planner, cmdtrace, runner
+import archive, sysindex
 
 def findscript(exename):
   """ Return true when the executable named exename is in the path. """
-  if subprocess.call(["which", exename]):
+  if not probe.which(exename):
     logging.error("{0} can not be found".format(exename))
     return False
   return True
@@ -45,14 +47,31 @@ class AutoRandR:
   """ Wraps around autorandr/auto-disper and provides a interface for display
   profiles """
 
-  def __init__(self):
-    """ Look up if everything we need is there """
+  def __init__(self, sysfsroot="/sys"):
+    """ Look up if everything we need is there. sysfsroot may point to a
+    fake sysfs tree for the monitor detection. """
     for i in ["disper", "auto-disper", "autorandr"]:
       if not findscript(i):
         sys.exit("{0} was not found in PATH".format(i))
     self.ardir = os.path.expanduser(u"~/.autorandr")
     self.gloardir = "/etc/autorandr"
+    self.sysdir = self.gloardir + "/profiles"
     self.arconf = self.ardir + u".conf" 
+    self.confstore = confstore.ConfStore(self.arconf)
+    self.detector = detect.DrmDetector(self.ardir, sysfsroot)
+    self.gpuid = gpuid.GpuId(self.ardir + u".gpumap", sysfsroot)
+    # lspci is only run for hardware whose gpuhash is not recorded yet, then
+    # right away, so it runs at the same time as xdpyinfo
+    self.probes = {}
+    if self.gpuid.lookup() is None:
+      self.probes['lspci'] = probe.Probe(["lspci", "-m"])
+    self.xcaps = probe.XCapabilities()
+    self.index = profileindex.ProfileIndex(self.ardir, self.ardir + u".index")
+    # Read-only profiles of the administrator, a user profile of the same
+    # name takes precedence
+    self.sysindex = sysindex.load(self.sysdir)
+    # (index generation, names, set of names) of the visible system profiles
+    self.systemnames = None
     self.autox()
     self.setupdir()
     self.getguiconf()
@@ -76,6 +95,8 @@ class AutoRandR:
       with open(self.ardir + '/' + filename, 'wb') as cf:
         conf.write(cf)
     self.conf = conf
+    if conf.has_option("Helpers", "command_timeout"):
+      runner.runner.timeout = conf.getfloat("Helpers", "command_timeout")
 
 
 
@@ -85,15 +106,10 @@ class AutoRandR:
       return self.autox_value
     else:
       """ When the GPU supports the NV-CONTROL extension we use autodispser """
-      findscript("xdpyinfo")
-      exe = subprocess.Popen("xdpyinfo", stdout=subprocess.PIPE)
-      xdpyinfo = exe.communicate()[0]
-      regex = re.compile(r'NV-CONTROL$')
-      for line in xdpyinfo.splitlines():
-        if regex.search(line):
-          logging.info("NV-CONTROL extension found. Using auto-disper.")
-          self.autox_value="auto-disper"
-          return self.autox_value
+      if self.xcaps.has("NV-CONTROL"):
+        logging.info("NV-CONTROL extension found. Using auto-disper.")
+        self.autox_value="auto-disper"
+        return self.autox_value
       logging.info("Using autorandr.")
       self.autox_value="autorandr"
       return self.autox_value
@@ -111,100 +127,154 @@ class AutoRandR:
 
   def getprofiles(self, showhidden=True):
     """ Gets a list of profilenames """
+    with cmdtrace.span("index"):
+      names = self.index.names() + self.__systemnames()
+    return self.__listing(names, showhidden)
+
+  def getcompatibleprofiles(self, showhidden=True):
+    """ Gets the names of the profiles saved with these display adapters or
+    without a gpuhash. Only the summaries of the others are looked at. """
+    gpuhash = self.getgpuhash()
+    with cmdtrace.span("index"):
+      names = self.index.compatible(gpuhash)
+      if self.sysindex is not None:
+        system = self.__systemnames(True)
+        names = names + [ i for i in self.sysindex.compatible(gpuhash) \
+            if i in system ]
+    return self.__listing(names, showhidden)
+
+  def __listing(self, names, showhidden):
+    """ Sorts the profile names, without the hidden ones unless showhidden """
     plist= []
-    for entry in os.listdir(self.ardir):
-      profiledir = self.ardir + os.sep + entry
-      if os.path.isdir(profiledir):
-        logging.debug(\
-            u"Looking for a profile. Testing {0}".format(profiledir))
-        content = os.listdir(profiledir)
-        logging.debug(u"Found {0} in candidate profile {1}".format(repr(content), entry))
-        if "config" in content:
-          if showhidden == True:
-            plist.append(entry)
-            logging.info(u"Found a profile named {0}".format(entry))
-          elif entry[0] != '.': # Hidden Profiles start with a dot
-            plist.append(entry)
-            logging.info(u"Found a profile named {0}".format(entry))
+    for entry in names:
+      if showhidden == True:
+        plist.append(entry)
+      elif entry[0] != '.': # Hidden Profiles start with a dot
+        plist.append(entry)
+    logging.debug(u"Found the profiles {0}".format(repr(plist)))
+    self.index.save()
     plist.sort(key=unicode.lower)
     return plist
 
-  def __getprofilefile(self, name, filename):
-    """ Gets a file from a given profile and reads the first line """
-    try:
-      fp = open( self.ardir + os.sep + name + os.sep + filename )
-      content = fp.readline().strip()
-      fp.close()
-    except IOError as e:
-      logging.info(u"Profile {0} has no {1} file".format(name, filename))
-      return None
-    return content
+  def __systemnames(self, asset=False):
+    """ The names of the system profiles not hidden by a user profile, as a
+    list or a set. Only computed again when the user profiles changed. """
+    if self.sysindex is None:
+      return set() if asset else []
+    user = self.index.names()
+    if self.systemnames is None or \
+        self.systemnames[0] != self.index.generation:
+      user = set(user)
+      names = [ i for i in self.sysindex.names() if i not in user ]
+      self.systemnames = (self.index.generation, names, frozenset(names))
+    if asset:
+      return self.systemnames[2]
+    return list(self.systemnames[1])
+
+  def issystemprofile(self, name):
+    """ Returns true if name is a read-only profile of the system """
+    return name in self.__systemnames(True)
+
+  def profiledir(self, name):
+    """ Returns the directory of a profile """
+    if self.issystemprofile(name):
+      return self.sysdir + os.sep + name
+    return self.ardir + os.sep + name
+
+  def __entry(self, name):
+    """ Returns the index entry of a user or system profile or None """
+    if self.issystemprofile(name):
+      return self.sysindex.entry(name)
+    return self.index.entry(name)
 
   def getprofileinfo(self, name, detectedprofiles=None):
     """ Returns a dict with the details to a profile """
-    info = {}
-    try:
-      config = open( self.ardir + os.sep + name + os.sep + "config" )
-    except IOError as e:
+    entry = self.__entry(name)
+    if not entry:
       logging.error(u"Profile {0} does not exist or is damaged".format(name))
       return None
-    info['name'] = name
-    info['comment'] = self.__getprofilefile(name, 'comment')
-    info['gpuhash'] = self.__getprofilefile(name, 'gpuhash')
-    if not detectedprofiles:
+    if detectedprofiles is None:
       detectedprofiles = self.getdetectedprofile()
-    if name in detectedprofiles:
-      info['isdetected']=True
-    else:
-      info['isdetected']=False
-    if self.getdefaultprofile() == name:
-      info['isdefault']=True
+    return self.__buildinfo(name, entry, detectedprofiles, \
+        self.getdefaultprofile(), self.getactiveprofile())
+
+  def getprofilesummary(self, name):
+    """ Returns a dict with the name, comment and gpuhash of a profile without
+    looking at its state or its config """
+    if self.issystemprofile(name):
+      entry = self.sysindex.entry(name)
     else:
-      info['isdefault']=False
-    if self.getactiveprofile() == name:
-      info['isactive']=True
+      entry = self.index.summary(name)
+    if not entry:
+      return None
+    return { 'name': name, 'comment': entry['comment'], \
+        'gpuhash': entry['gpuhash'] }
+
+  def getallprofileinfo(self, showhidden=True, detectedprofiles=None, \
+      compatible=False):
+    """ Returns a dict with the details of every profile by its name, only
+    of those of these display adapters if compatible. The configuration, the
+    detected profiles and the profile directory are only read once. """
+    if compatible:
+      names = self.getcompatibleprofiles(showhidden)
     else:
-      info['isactive']=False
-    outputs = []
-    modes = []
-    positions = []
-    info['config'] = {}
-    for line in config.readlines():
-      line = line.split()
-      if line[0] == "output":
-        outputs.append(line[1:])
-      elif line[0] == "off":
-        outputs.pop()
-      elif line[0] == "mode":
-        modes.append(line[1:])
-      elif line[0] == "pos":
-        if line[1:] == ["0x0"]:
-          pos = ""
-        else:
-          pos = line[1:]
-        positions.append(pos)
-      elif line[0] == "metamode:":
-        nvi = " ".join(line[1:]).split(",")
-        for i in nvi:
-          logging.debug(repr(i))
-          j = i.split()
-          outputs.append(j[0].strip(":").strip())
-          modes.append(j[2].strip("@").strip())
-          if j[3].strip() == "+0+0":
-            positions.append("")
-          else:
-            positions.append(j[3].strip("+").strip())
-    for i in range(len(outputs)):
-      # FIXME Make the next line nicer
-      info['config']["".join(outputs[i])] = [ "".join(modes[i]), "".join(positions[i]) ]
+      names = self.getprofiles(showhidden)
+    if detectedprofiles is None:
+      detectedprofiles = self.getdetectedprofile()
+    conf = self.__readconf()
+    default = conf.get("DEFAULT_PROFILE")
+    active = conf.get("ACTIVE_PROFILE")
+    infos = {}
+    system = self.__systemnames(True)
+    for name in names:
+      if name in system:
+        entry = self.sysindex.entry(name)
+      else:
+        entry = self.index.entry(name)
+      if entry:
+        infos[name] = self.__buildinfo(name, entry, detectedprofiles, \
+            default, active)
+    self.index.save()
+    return infos
+
+  def __buildinfo(self, name, entry, detectedprofiles, default, active):
+    """ Combines a profile index entry with the current state """
+    info = {}
+    info['name'] = name
+    info['comment'] = entry['comment']
+    info['gpuhash'] = entry['gpuhash']
+    info['isdetected'] = name in detectedprofiles
+    info['isdefault'] = default == name
+    info['isactive'] = active == name
+    # Only entries of the system index carry the setup
+    info['issystem'] = 'setup' in entry
+    info['config'] = dict(entry['config'])
     logging.debug(u"Profile {0} has: {1}".format(name, repr(info['config'])))
     return info
  
   def getdetectedprofile(self):
-    """ Returns the name of the detected profiles or None """
+    """ Returns the name of the detected profiles or None. Profiles of other
+    display adapters are never detected. """
+    with cmdtrace.span("detection"):
+      return self.__detect()
+
+  def __detect(self):
+    """ Asks sysfs, or autorandr or auto-disper, for the detected profiles """
+    gpuhash = self.getgpuhash()
+    if self.autox() == "autorandr" and self.detector.available():
+      extra = None
+      if self.sysindex is not None:
+        system = self.__systemnames(True)
+        extra = self.sysindex.fingerprints([ i for i in \
+            self.sysindex.compatible(gpuhash) if i in system ])
+      detected = self.detector.detect(self.index.compatible(gpuhash), extra)
+      if detected is not None:
+        return detected
+      logging.info(u"Asking autorandr for the detected profiles")
+    # auto-disper fingerprints via disper, which has no sysfs counterpart, and
+    # autorandr knows the output names of drivers which sysfs does not
     name = []
-    exe = subprocess.Popen(self.autox(), stdout=subprocess.PIPE)
-    clist = exe.communicate()[0].decode('utf-8')
+    clist = runner.run([self.autox()]).out.decode('utf-8')
     regex = re.compile(r'\(detected\)$')
     for line in clist.splitlines():
       logging.debug(u"Searching (detected) in {0}".format(line.strip()))
@@ -212,13 +282,12 @@ class AutoRandR:
         name.append(" ".join(line.split()[0:-1]))
           # Any profile which has a whitespace other than <SPACE> will fail here
         logging.info(u"Found detected profile(s) {0}".format(name))
-    return name
+    compatible = self.getcompatibleprofiles()
+    return [ i for i in name if i in compatible ]
 
   def fallback(self):
     """ Uses disper to display something. Used in hotkey mode """
-    exe = subprocess.Popen(["disper","-c","-d auto"], \
-      stdout=subprocess.PIPE)
-    out = exe.communicate()[0]
+    runner.run(["disper","-c","-d auto"])
 
   def getactiveprofile(self):
     """ Returns the last set profile """
@@ -230,74 +299,155 @@ class AutoRandR:
 
   def getconf(self, name):
     """ Returns a variable from the configuration file """
-    try:
-      arconf = codecs.open( self.arconf, encoding='utf-8')
-    except IOError as e:
-      logging.info("Configuration file not found.")
-      return None
-    regex = re.compile(r'^{0}='.format(name.upper()))
-    for line in arconf.readlines():
-      search = regex.search(line)
-      if search:
-        default = line[search.end():].strip().strip('"')
-        logging.info(u"Found Configuration {0} - set to {1}".format(name, default))
-        return default
+    default = self.confstore.get(name)
+    if default is not None:
+      logging.info(u"Found Configuration {0} - set to {1}".format(name, default))
+      return default
     logging.info(u"Configuration {0} not found.".format(name))
     return None
 
+  def __readconf(self):
+    """ Returns all variables of the configuration file in a dict """
+    return self.confstore.getall()
+
   def setprofile(self, name, force=False):
-    """ Asks autorandr to set this profile """
+    """ Loads a profile, only changing what differs from the current setup """
+    load = self.prepareload(name)
+    if load is None:
+      return False
+    return self.loadprepared(load, force)
+
+  def prepareload(self, name):
+    """ Looks up what loading a profile needs from the profile index, so
+    loadprepared() can run on another thread. Returns None if there is no
+    such profile. """
     logging.info(u"Trying to set profile {0}".format(name))
     if name not in self.getprofiles():
       logging.error(u"The profile {0} can not be found".format(name)) 
-      return False
+      return None
+    return { 'name': name, \
+        'config': self.profiledir(name) + os.sep + "config", \
+        'system': self.issystemprofile(name), 'hooks': self.__hooks(name) }
+
+  def loadprepared(self, load, force=False):
+    """ Loads a profile prepared by prepareload(). It only runs commands and
+    does not touch the profile index or the configuration. """
+    launches = self.__plan(load, force)
+    if not launches:
+      logging.info(u"Profile {0} is already loaded".format(load['name']))
+      return True
+    return self.__runlaunches(load['name'], launches)
+
+  def __runlaunches(self, name, launches):
+    """ Runs the commands loading a profile. Only a failure of the first
+    one is fatal, the others are hooks. """
+    for launch in launches:
+      logging.debug(u"Trying to set profile with {0}".format(repr(launch)))
+      result = runner.run(launch)
+      out = result.out
+      ret = result.returncode
+      if ret != 0:
+        for line in out.splitlines():
+          logging.error(launch[0] + ": " + line)
+        logging.error(u"Loading profile {0} was unsucessful".format(name))
+        if launch is launches[0]:
+          return False
+        continue
+      for line in out.splitlines():
+        logging.info(launch[0] + ": " + line)
+    logging.info(u"Loading profile {0} was sucessful".format(name))
+    return True
+
+  def planprofile(self, name, force=False):
+    """ Returns the commands setprofile runs to load a profile. With
+    autorandr this is a single xrandr call for the outputs that differ
+    from the current setup, followed by the postswitch hooks, or nothing if
+    the profile is already in place. auto-disper profiles are still loaded
+    by auto-disper. System profiles are loaded from their directory, which
+    the tools do not know about. """
+    load = self.prepareload(name)
+    if load is None:
+      return []
+    return self.__plan(load, force)
+
+  def __plan(self, load, force):
+    """ See planprofile, force loads the whole profile with the tools """
+    name = load['name']
+    config = load['config']
+    if not force and self.autox() == "autorandr" and probe.which("xrandr"):
+      try:
+        target = planner.parseconfig(config)
+      except IOError as e:
+        target = None
+      current = None
+      if target is not None:
+        current = planner.querystate()
+      if current is not None:
+        return self.__withhooks(load['hooks'], name, \
+            planner.plan(current, target))
+    if load['system']:
+      if self.autox() == "autorandr":
+        # What autorandr -l does with the config
+        launch = [ "sh", "-c", 'sed "s/^/--/" "$1" | xargs xrandr', \
+            "xrandr", config ]
+      else:
+        launch = [ "sh", "-c", 'exec disper -i < "$1"', "disper", config ]
+      return self.__withhooks(load['hooks'], name, launch)
     launch = [ self.autox(), "-l", name ]
     if force == True:
       launch.append("--force")
-    logging.debug(u"Trying to set profile with {0}".format(repr(launch)))
-    exe = subprocess.Popen(launch, stdout=subprocess.PIPE)
-    out = exe.communicate()[0]
-    ret = exe.returncode
-    if ret != 0:
-      for line in out.splitlines():
-        logging.error(self.autox() + ": " + line)
-        logging.error(u"Loading profile {0} was unsucessful".format(name))
+    return [launch]
+
+  def __hooks(self, name):
+    """ The postswitch hooks autorandr -l runs after loading a profile """
+    return [ hook for hook in [self.profiledir(name) + os.sep + \
+        "postswitch", self.ardir + os.sep + "postswitch"] \
+        if os.access(hook, os.X_OK) ]
+
+  def __withhooks(self, hooks, name, launch):
+    """ Adds the postswitch hooks to an xrandr command """
+    if not launch:
+      return []
+    return [launch] + [ [hook, name] for hook in hooks ]
+
+  def snapshot(self):
+    """ Remembers the current setup so restore() can go back to it. With
+    autorandr the state is kept in memory from a single xrandr query. If
+    that is not possible, or the setup has settings like panning which can
+    not be planned, it is saved as the profile .hotkey and None is
+    returned. """
+    with cmdtrace.span("snapshot"):
+      if self.autox() == "autorandr" and probe.which("xrandr"):
+        state = planner.querystate()
+        if state is not None and planner.complete(state):
+          return state
+      self.saveprofile(".hotkey", None, True)
+      return None
+
+  def restore(self, snapshot):
+    """ Goes back to the setup remembered by snapshot() """
+    if snapshot is None:
+      return self.setprofile(".hotkey")
+    logging.info(u"Restoring the previous setup")
+    current = planner.querystate()
+    if current is None:
       return False
-    for line in out.splitlines():
-      logging.info(self.autox() + ": " + line)
-      logging.info(u"Loading profile {0} was sucessful".format(name))
-    return True
+    launches = self.__withhooks(self.__hooks(".hotkey"), ".hotkey", \
+        planner.plan(current, snapshot))
+    if not launches:
+      return True
+    return self.__runlaunches(".hotkey", launches)
 
   def setconf(self, name, value):
     """ Sets a configuration entry in the configuration file """
-    if value == None:
-      value = ""
-    if os.path.isfile(self.arconf):
-      mode = "r+"
-    else:
-      mode = "w+"
-    try:
-      arconf = codecs.open(self.arconf, mode, encoding="utf-8")
-      regex = re.compile(r'^{0}='.format(name.upper()))
-      found = False
-      conf = []
-      for line in arconf:
-        search = regex.search(line)
-        if search:
-          found = True
-          conf = conf + [u'{0}="{1}"\n'.format(name.upper(), value)]
-        else:
-          conf.append(line)
-      if found == False:
-        conf = conf + [u'{0}="{1}"\n'.format(name.upper(), value)]
-      arconf.close()
-      arconf = codecs.open(self.arconf, 'w+', encoding="utf-8")
-      arconf.writelines(conf)
-      arconf.close()
-    except IOError as e:
-      logging.error(u"Failed to set {0} to {1}".format(name, value))
+    return self.setconfs({name: value})
+
+  def setconfs(self, values):
+    """ Sets several configuration entries with a single write """
+    if not self.confstore.update(values):
+      logging.error(u"Failed to set {0}".format(repr(values)))
       return False
-    logging.info(u"Set {0} to {1}".format(name, value))
+    logging.info(u"Set {0}".format(repr(values)))
     return True
 
   def setdefaultprofile(self, name):
@@ -312,17 +462,32 @@ class AutoRandR:
     return self.setconf("active_profile", name)
 
   def saveprofile(self, name, comment=None, force=False):
-    """ Saves a profile according to the comment and the current settings """
+    """ Saves a profile according to the comment and the current settings.
+    Hidden profiles like .boot only get a gpuhash if it is known without
+    running lspci. """
+    if not self.maysaveprofile(name, force):
+      return False
+    if not self.runsaveprofile(name):
+      return False
+    self.finishsaveprofile(name, comment)
+    return True
+
+  def maysaveprofile(self, name, force=False):
+    """ Returns false if the profile exists and may not be overwritten """
     if name in self.getprofiles():
       logging.error(u"A profile with the name {0} already exists.".format(name))
       if not force:
         return False
+    return True
+
+  def runsaveprofile(self, name):
+    """ Lets autorandr or auto-disper save the current settings. It only
+    runs the command, finishsaveprofile() completes the profile. """
     launch = [ self.autox(), "-s", name ]
     logging.debug(u"Trying to save profile with {0}".format(repr(launch)))
-    exe = subprocess.Popen(launch, stdout=subprocess.PIPE, \
-        stderr=subprocess.PIPE)
-    out = exe.communicate()[0]
-    ret = exe.returncode
+    result = runner.run(launch)
+    out = result.out
+    ret = result.returncode
     if ret != 0:
       for line in out.splitlines():
         logging.error(self.autox() + ": " + line)
@@ -331,36 +496,83 @@ class AutoRandR:
     for line in out.splitlines():
       logging.info(self.autox() + ": " + line)
       logging.info(u"Saving profile {0} was sucessful".format(name))
+    return True
+
+  def finishsaveprofile(self, name, comment=None):
+    """ Writes the comment and the gpuhash of a saved profile and updates the
+    profile index """
     if comment:
       self.__saveextraprofilefile(name, 'comment', comment)
-    self.__saveextraprofilefile(name, 'gpuhash', self.getgpuhash())
-    return True
+    if name[0] == '.':
+      gpuhash = self.knowngpuhash()
+    else:
+      gpuhash = self.getgpuhash()
+    if gpuhash is not None:
+      self.__saveextraprofilefile(name, 'gpuhash', gpuhash)
+    # Only now, so the index never caches the profile without its files
+    self.detector.invalidate()
+    self.index.invalidate(name)
+
+  def knowngpuhash(self):
+    """ Returns the gpuhash if it is known without running lspci, or None """
+    if hasattr(self, "gpuhash_value"):
+      return self.gpuhash_value
+    return self.gpuid.lookup()
 
   def getgpuhash(self):
+    """ Returns the hash identifying the display adapters. It is taken from
+    the mapping recorded by gpuid and only computed from lspci for hardware
+    that has not been seen before. """
+    if hasattr(self, "gpuhash_value"):
+      return self.gpuhash_value
+    with cmdtrace.span("gpuhash"):
+      gpuhash = self.gpuid.lookup()
+      if gpuhash is None:
+        gpuhash = self.__lspcihash()
+        self.gpuid.record(gpuhash)
+    logging.debug(u"gpuhash: {0}".format(gpuhash))
+    self.gpuhash_value = gpuhash
+    return gpuhash
+
+  def hardwarechanged(self):
+    """ Scans the display adapters again, returns true if they are not the
+    ones seen before """
+    seen = self.gpuid.adapters
+    self.gpuid.adapters = None
+    if seen is None:
+      return False
+    return self.gpuid.scan() != seen
+
+  def forgethardware(self):
+    """ Forget what is known about the display adapters and monitors """
+    if hasattr(self, "gpuhash_value"):
+      del self.gpuhash_value
+    self.gpuid.adapters = None
+    self.probes.pop('lspci', None)
+    self.detector.invalidate()
+
+  def __lspcihash(self):
     """ Creates a hash out of the lspci line of the display adapter and
       if neccessary also the driver (fglrx, nvidia). Necessary for detecting
       incompatible profiles.i """
     # I hope we have never to support USB display adapters
+    if 'lspci' not in self.probes:
+      self.probes['lspci'] = probe.Probe(["lspci", "-m"])
     lspci =""
-    exe = subprocess.Popen(['lspci','-m'], stdout=subprocess.PIPE)
-    for line in exe.stdout:
+    for line in self.probes['lspci'].output().splitlines():
       if '"VGA compatible controller"' in line:
         lspci = lspci + line.strip() + os.linesep
         logging.debug(u"lspci: {0}".format(line.strip()))
-    exe.wait()
+    # The markers come from the X extensions like they always did, the
+    # bound drivers (e.g. fglrx_pci) would give other hashes than the ones
+    # stored in the profiles
     # To distinguish between nvidia and nouveau
     if self.autox() == 'auto-disper':
       lspci = lspci + 'nvidia'
     # Check for FGLRX
-    exe = subprocess.Popen("xdpyinfo", stdout=subprocess.PIPE)
-    xdpyinfo = exe.communicate()[0]
-    regex = re.compile(r'ATIFGLEXTENSION$')
-    for line in xdpyinfo.splitlines():
-      if regex.search(line):
-        lspci = lspci + 'fglrx'
-    lspcihash = hashlib.md5(lspci).hexdigest()
-    logging.debug(u"gpuhash: {0}".format(lspcihash))
-    return lspcihash
+    if self.xcaps.has("ATIFGLEXTENSION"):
+      lspci = lspci + 'fglrx'
+    return hashlib.md5(lspci).hexdigest()
 
   def __saveextraprofilefile(self, name, filename, content):
     """ Save an extra one-line file for a profile """
@@ -377,16 +589,71 @@ class AutoRandR:
     if name not in self.getprofiles():
       logging.error(u"The profile {0} cannot be found.".format(name))
       return False
+    if self.issystemprofile(name):
+      logging.error(u"The system profile {0} is read-only.".format(name))
+      return False
     try:
       shutil.rmtree(self.ardir + os.sep + name)
     except OSError as e:
       logging.error(u"Deleting profile {0} failed.".format(name))
       return False
+    self.detector.invalidate()
+    self.index.invalidate(name)
+    conf = {}
     if name == self.getdefaultprofile():
-      self.setdefaultprofile(None)
+      conf["default_profile"] = None
+    if name == self.getactiveprofile():
+      conf["active_profile"] = None
+    if conf:
+      self.setconfs(conf)
     logging.info(u"Profile {0} was deleted".format(name))
     return True
 
+  def exportprofiles(self, fp, names=None, compress=False):
+    """ Writes the profiles names, or all of them, as a tar stream to the
+    file object fp. System profiles are not exported. Returns the names of
+    the exported profiles. """
+    profiles = self.index.names()
+    if names is None:
+      names = profiles
+    for name in names:
+      if name not in profiles:
+        logging.error(u"The profile {0} can not be found".format(name))
+        return None
+    return archive.export(self.ardir, names, fp, self.getdefaultprofile(), \
+        compress)
+
+  def importprofiles(self, fp, policy=archive.SKIP, setdefault=False, \
+      hooks=False):
+    """ Imports the profiles of a tar stream written by exportprofiles.
+    Existing profiles are skipped, overwritten or the imported ones renamed,
+    depending on policy. Hooks are only imported with hooks. The profile
+    index and, with setdefault, the default profile are updated once at the
+    end. Returns a dict with the imported, skipped and renamed profiles or
+    None if the archive could not be read. """
+    importer = archive.Importer(self.ardir, self.index.names(), policy, \
+        hooks)
+    try:
+      importer.read(fp)
+      imported, replaced = importer.finish()
+    except (IOError, OSError, tarfile.TarError) as e:
+      logging.error(u"Importing the profiles failed: {0}".format(e))
+      importer.abort()
+      return None
+    logging.info(u"Imported {0} profiles".format(len(imported)))
+    self.detector.invalidate()
+    self.index.invalidate()
+    for name in replaced:
+      self.index.invalidate(name)
+    self.getprofiles()
+    default = importer.renamed.get(importer.default, importer.default)
+    if setdefault and default in imported:
+      self.setdefaultprofile(default)
+    else:
+      default = None
+    return { 'imported': imported, 'skipped': importer.skipped, \
+        'renamed': importer.renamed, 'default': default }
+
 """ Load main() """
 if __name__ == "__main__":
   main()
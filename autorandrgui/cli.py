@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import logging, json, sys
+from optparse import OptionParser # depreciated in python 2.7+
+import autorandr, runner, archive
+
+USAGE = """%prog [options] COMMAND [ARGUMENTS]
+
+Commands:
+  list                  All profiles with their state
+  info PROFILE          The details of a profile
+  detected              The profiles matching the connected monitors
+  apply PROFILE         Load a profile
+  save PROFILE          Save the current setup as a profile
+  delete PROFILE        Delete a profile
+  set-default [PROFILE] Set the default profile, or unset it
+  export FILE [PROFILE...]
+                        Write the given or all profiles to a tar archive
+  import FILE           Add the profiles of a tar archive
+
+FILE may be - for the standard input or output. The result is printed as
+JSON, on the standard error if the archive is written to the standard
+output."""
+
+def main():
+  """ Parse the command line, run the command and print its result """
+  opts = OptionParser(usage=USAGE)
+  opts.add_option("-a", "--all", dest="all", action="store_true", \
+      help="Include hidden profiles in list.")
+  opts.add_option("-c", "--comment", dest="comment", \
+      help="The comment of a saved profile.")
+  opts.add_option("-f", "--force", dest="force", action="store_true", \
+      help="Overwrite an existing profile with save, reload with apply.")
+  opts.add_option("-z", "--gzip", dest="gzip", action="store_true", \
+      help="Compress the exported archive.")
+  opts.add_option("--conflict", dest="conflict", default=archive.SKIP, \
+      type="choice", choices=archive.POLICIES, \
+      help="What import does with existing profiles: skip, overwrite or " \
+      "rename [%default].")
+  opts.add_option("--set-default", dest="setdefault", action="store_true", \
+      help="Make the default profile of the archive the default on import.")
+  opts.add_option("--with-hooks", dest="hooks", action="store_true", \
+      help="Also import the hooks of the profiles, which are executed.")
+  opts.add_option("-d", "--debug", dest="debug", action="store_true", \
+      help="Enable debug output.")
+  (options, args) = opts.parse_args()
+  if options.debug == True:
+    logging.basicConfig(level=logging.DEBUG)
+  else:
+    logging.basicConfig(level=logging.WARNING)
+  if not args or args[0] not in COMMANDS:
+    opts.error("Please give one of the commands")
+  command, least, most = COMMANDS[args[0]]
+  args = [ i.decode('utf-8') for i in args[1:] ]
+  if len(args) < least or (most is not None and len(args) > most):
+    opts.error("Wrong number of arguments for {0}".format(command.__name__))
+  cli = Cli(autorandr.AutoRandR())
+  with runner.transaction("cli"):
+    try:
+      result = command(cli, options, *args)
+      ok = True
+    except CliError as e:
+      result = { 'error': unicode(e) }
+      ok = False
+  out = sys.stdout
+  if cli.stdoutused:
+    out = sys.stderr
+  json.dump(result, out, indent=1, sort_keys=True)
+  out.write("\n")
+  if not ok:
+    sys.exit(1)
+
+
+class CliError(Exception):
+  """ A command failed, the message is reported as the error """
+  pass
+
+
+class Cli:
+  """ The commands, each returns something that can be printed as JSON """
+
+  def __init__(self, ar):
+    """ ar is an autorandr.AutoRandR """
+    self.ar = ar
+    self.stdoutused = False
+
+  def describe(self, info):
+    """ Turns the info of AutoRandR.getprofileinfo into the printed form """
+    gpuhash = self.ar.getgpuhash()
+    return { 'name': info['name'], 'comment': info['comment'], \
+        'gpuhash': info['gpuhash'], \
+        'compatible': info['gpuhash'] in (None, gpuhash), \
+        'detected': info['isdetected'], 'default': info['isdefault'], \
+        'active': info['isactive'], \
+        'outputs': dict((output, { 'mode': mode, 'position': pos or "0x0" }) \
+            for output, (mode, pos) in info['config'].items()) }
+
+  def exists(self, name):
+    """ Raises CliError if there is no profile name """
+    if name not in self.ar.getprofiles():
+      raise CliError(u"The profile {0} does not exist".format(name))
+
+  def list(self, options):
+    """ All profiles in one pass over the profile index """
+    infos = self.ar.getallprofileinfo(showhidden=bool(options.all))
+    return [ self.describe(infos[name]) for name in sorted(infos, \
+        key=unicode.lower) ]
+
+  def info(self, options, name):
+    """ A single profile """
+    self.exists(name)
+    info = self.ar.getprofileinfo(name)
+    if info is None:
+      raise CliError(u"The profile {0} is damaged".format(name))
+    return self.describe(info)
+
+  def detected(self, options):
+    """ The names of the detected profiles """
+    return self.ar.getdetectedprofile()
+
+  def apply(self, options, name):
+    """ Load a profile and mark it active """
+    self.exists(name)
+    if not self.ar.setprofile(name, bool(options.force)):
+      raise CliError(u"Loading the profile {0} failed".format(name))
+    self.ar.setactiveprofile(name)
+    return { 'applied': name }
+
+  def save(self, options, name):
+    """ Save the current setup """
+    if not self.ar.saveprofile(name, options.comment, bool(options.force)):
+      raise CliError(u"Saving the profile {0} failed".format(name))
+    return { 'saved': name }
+
+  def delete(self, options, name):
+    """ Delete a profile """
+    self.exists(name)
+    if not self.ar.deleteprofile(name):
+      raise CliError(u"Deleting the profile {0} failed".format(name))
+    return { 'deleted': name }
+
+  def setdefault(self, options, name=None):
+    """ Set or, without a name, unset the default profile """
+    if name is not None:
+      self.exists(name)
+    if not self.ar.setdefaultprofile(name):
+      raise CliError(u"Setting the default profile failed")
+    return { 'default': name }
+
+  def export(self, options, filename, *names):
+    """ Write profiles to an archive """
+    if not names:
+      names = None
+    if filename == "-":
+      self.stdoutused = True
+      exported = self.ar.exportprofiles(sys.stdout, names, \
+          bool(options.gzip))
+    else:
+      try:
+        with open(filename, "wb") as fp:
+          exported = self.ar.exportprofiles(fp, names, bool(options.gzip))
+      except IOError as e:
+        raise CliError(u"Could not write {0}".format(filename))
+    if exported is None:
+      raise CliError(u"Some of the profiles do not exist")
+    return { 'exported': exported }
+
+  def importarchive(self, options, filename):
+    """ Add the profiles of an archive """
+    if filename == "-":
+      result = self.ar.importprofiles(sys.stdin, options.conflict, \
+          bool(options.setdefault), bool(options.hooks))
+    else:
+      try:
+        with open(filename, "rb") as fp:
+          result = self.ar.importprofiles(fp, options.conflict, \
+              bool(options.setdefault), bool(options.hooks))
+      except IOError as e:
+        raise CliError(u"Could not read {0}".format(filename))
+    if result is None:
+      raise CliError(u"The archive {0} could not be imported".format(\
+          filename))
+    return result
+
+
+""" The commands by name with the least and most number of arguments they
+accept, None for any number """
+COMMANDS = {
+    'list': (Cli.list, 0, 0),
+    'info': (Cli.info, 1, 1),
+    'detected': (Cli.detected, 0, 0),
+    'apply': (Cli.apply, 1, 1),
+    'save': (Cli.save, 1, 1),
+    'delete': (Cli.delete, 1, 1),
+    'set-default': (Cli.setdefault, 0, 1),
+    'export': (Cli.export, 1, None),
+    'import': (Cli.importarchive, 1, 1),
+    }
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import subprocess, threading, logging, json, time, os, sys, socket
+from contextlib import contextmanager
+
+""" Version of the timeline written by Tracer.dump """
+VERSION = 1
+
+def main():
+  """ Trace a few commands and print the timeline """
+  logging.basicConfig(level=logging.DEBUG)
+  enable("/dev/stdout")
+  with operation("refresh"):
+    with span("detection"):
+      exe = Popen(["ls", "/"], stdout=subprocess.PIPE)
+      exe.communicate()
+  dump()
+
+
+class TracedPopen(subprocess.Popen):
+  """ A subprocess.Popen which reports itself to a Tracer when it has been
+  waited for """
+
+  def __init__(self, tracer, args, **kwargs):
+    """ Start the command """
+    self.tracer = tracer
+    self.args = args
+    self.traced = False
+    self.incommunicate = False
+    self.outsize = None
+    self.operation = tracer.current()
+    self.started = time.time()
+    subprocess.Popen.__init__(self, args, **kwargs)
+    tracer.running.add(self)
+
+  def communicate(self, *args, **kwargs):
+    """ Like subprocess.Popen.communicate, notes the size of the output """
+    self.incommunicate = True
+    try:
+      out = subprocess.Popen.communicate(self, *args, **kwargs)
+    finally:
+      self.incommunicate = False
+    self.outsize = sum(len(i) for i in out if i)
+    self.__done()
+    return out
+
+  def wait(self, *args, **kwargs):
+    """ Like subprocess.Popen.wait """
+    ret = subprocess.Popen.wait(self, *args, **kwargs)
+    if not self.incommunicate:
+      self.__done()
+    return ret
+
+  def __done(self):
+    """ Report the finished command once """
+    if self.traced:
+      return
+    self.traced = True
+    self.tracer.running.discard(self)
+    self.tracer.process(self.args, self.started, time.time(), \
+        self.returncode, self.outsize, self.operation)
+
+
+class Tracer:
+  """ Records every external command and the time spent in named spans,
+  together with the operation (boot, hotkey, apply, save, refresh, ...) that
+  caused them. Nothing is recorded until enable() is called. """
+
+  def __init__(self):
+    """ A disabled tracer """
+    self.filename = None
+    self.events = []
+    self.running = set()
+    self.lock = threading.Lock()
+    self.local = threading.local()
+    self.started = time.time()
+
+  def enabled(self):
+    """ Returns true when events are recorded """
+    return self.filename is not None
+
+  def enable(self, filename):
+    """ Start recording, dump() writes the timeline to filename """
+    self.filename = filename
+    self.started = time.time()
+
+  def current(self):
+    """ The outermost operation of this thread or None """
+    stack = getattr(self.local, 'operations', None)
+    if stack:
+      return stack[0]
+    return None
+
+  def record(self, event):
+    """ Add an event to the timeline """
+    event['thread'] = threading.current_thread().name
+    with self.lock:
+      self.events.append(event)
+
+  def process(self, args, started, finished, returncode, outsize, op):
+    """ Record a finished external command """
+    if isinstance(args, basestring):
+      args = [args]
+    self.record({ 'type': 'process', 'argv': list(args), \
+        'start': started - self.started, 'duration': finished - started, \
+        'exit': returncode, 'output': outsize, 'operation': op })
+
+  def cached(self, args):
+    """ Record a command answered from a cache instead of being run """
+    if self.enabled():
+      self.record({ 'type': 'cached', 'argv': list(args), \
+          'start': time.time() - self.started, 'duration': 0, \
+          'operation': self.current() })
+
+  def popen(self, args, **kwargs):
+    """ Start a command like subprocess.Popen """
+    if not self.enabled():
+      return subprocess.Popen(args, **kwargs)
+    return TracedPopen(self, args, **kwargs)
+
+  @contextmanager
+  def operation(self, name):
+    """ Everything within belongs to the operation name, unless an outer
+    operation is already running in this thread """
+    if not hasattr(self.local, 'operations'):
+      self.local.operations = []
+    self.local.operations.append(name)
+    try:
+      with self.span(name, 'operation'):
+        yield
+    finally:
+      self.local.operations.pop()
+
+  @contextmanager
+  def span(self, name, kind='span'):
+    """ Time a stage like detection or gpuhash """
+    if not self.enabled():
+      yield
+      return
+    op = self.current()
+    started = time.time()
+    try:
+      yield
+    finally:
+      self.record({ 'type': kind, 'name': name, \
+          'start': started - self.started, \
+          'duration': time.time() - started, 'operation': op })
+
+  def timeline(self):
+    """ Returns the recorded events with some facts about this run """
+    with self.lock:
+      events = list(self.events)
+    # Commands nobody waits for, like the display settings tool
+    for exe in list(self.running):
+      events.append({ 'type': 'process', 'argv': list(exe.args), \
+          'start': exe.started - self.started, 'duration': None, \
+          'exit': exe.poll(), 'output': None, 'operation': exe.operation, \
+          'thread': None })
+    events.sort(key=lambda event: event['start'])
+    return { 'version': VERSION, 'host': socket.gethostname(), \
+        'argv': sys.argv, 'pid': os.getpid(), 'started': self.started, \
+        'events': events }
+
+  def dump(self):
+    """ Write the timeline to the file given to enable() """
+    if not self.enabled():
+      return False
+    try:
+      with open(self.filename, 'w') as fp:
+        json.dump(self.timeline(), fp, indent=1)
+    except IOError as e:
+      logging.error(u"Could not write the trace {0}".format(self.filename))
+      return False
+    logging.info(u"Wrote {0} trace events to {1}".format(len(self.events), \
+        self.filename))
+    return True
+
+
+""" The tracer of this process """
+tracer = Tracer()
+
+def enable(filename):
+  """ See Tracer.enable """
+  tracer.enable(filename)
+
+def dump():
+  """ See Tracer.dump """
+  return tracer.dump()
+
+def Popen(args, **kwargs):
+  """ Use instead of subprocess.Popen, see Tracer.popen """
+  return tracer.popen(args, **kwargs)
+
+def operation(name):
+  """ See Tracer.operation """
+  return tracer.operation(name)
+
+def span(name):
+  """ See Tracer.span """
+  return tracer.span(name)
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
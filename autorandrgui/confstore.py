@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, re, codecs, tempfile
+import cmdtrace
+
+def main():
+  """ Print ~/.autorandr.conf if called directly """
+  logging.basicConfig(level=logging.DEBUG)
+  store = ConfStore(os.path.expanduser(u"~/.autorandr.conf"))
+  print(repr(store.getall()))
+
+
+class ConfStore:
+  """ Holds the variables of ~/.autorandr.conf (NAME="value" lines). The file
+  is parsed once and only read again when its mtime or size changes. Writes
+  go to a temporary file which is renamed over the configuration file. """
+
+  regex = re.compile(r'^([A-Za-z0-9_]+)=')
+
+  def __init__(self, filename):
+    """ Nothing is read until the first access """
+    self.filename = filename
+    self.stamp = None
+    self.conf = {}
+
+  def __stamp(self):
+    """ Returns (mtime, size) of the configuration file or None """
+    try:
+      st = os.stat(self.filename)
+    except OSError as e:
+      return None
+    return (st.st_mtime, st.st_size)
+
+  def __readlines(self):
+    """ Returns the lines of the configuration file """
+    try:
+      with codecs.open(self.filename, encoding='utf-8') as arconf:
+        return arconf.readlines()
+    except IOError as e:
+      logging.info("Configuration file not found.")
+      return []
+
+  def __parse(self, lines):
+    """ Turns the lines into a dict, the first assignment wins """
+    conf = {}
+    for line in lines:
+      search = self.regex.search(line)
+      if search and search.group(1).upper() not in conf:
+        conf[search.group(1).upper()] = \
+            line[search.end():].strip().strip('"')
+    return conf
+
+  def getall(self):
+    """ Returns all variables, reloads the file if it has changed """
+    stamp = self.__stamp()
+    if stamp is None:
+      self.stamp = None
+      self.conf = {}
+    elif stamp != self.stamp:
+      logging.debug(u"Reading configuration file {0}".format(self.filename))
+      with cmdtrace.span("conf-read"):
+        self.conf = self.__parse(self.__readlines())
+      self.stamp = stamp
+    return self.conf
+
+  def get(self, name):
+    """ Returns a variable or None """
+    return self.getall().get(name.upper())
+
+  def set(self, name, value):
+    """ Sets a single variable """
+    return self.update({name: value})
+
+  def update(self, values):
+    """ Sets several variables with a single write. A value of None is
+    written as an empty string. """
+    with cmdtrace.span("conf-write"):
+      return self.__update(values)
+
+  def __update(self, values):
+    """ Rewrites the configuration file with values """
+    values = dict((k.upper(), v if v is not None else u"") \
+        for k, v in values.items())
+    conf = []
+    written = set()
+    for line in self.__readlines():
+      search = self.regex.search(line)
+      name = search and search.group(1).upper()
+      if name in values:
+        if name not in written:
+          conf.append(u'{0}="{1}"\n'.format(name, values[name]))
+          written.add(name)
+      else:
+        conf.append(line)
+    for name in sorted(values):
+      if name not in written:
+        conf.append(u'{0}="{1}"\n'.format(name, values[name]))
+    directory = os.path.dirname(self.filename) or os.curdir
+    try:
+      fd, tmpname = tempfile.mkstemp(prefix=".autorandr.conf.", dir=directory)
+      try:
+        with os.fdopen(fd, 'w') as fp:
+          fp.write(u"".join(conf).encode('utf-8'))
+          fp.flush()
+          os.fsync(fp.fileno())
+        try:
+          os.chmod(tmpname, os.stat(self.filename).st_mode & 0777)
+        except OSError as e:
+          os.chmod(tmpname, 0644)
+        os.rename(tmpname, self.filename)
+      except:
+        os.unlink(tmpname)
+        raise
+    except (IOError, OSError) as e:
+      logging.error(u"Failed to write {0}".format(self.filename))
+      return False
+    self.conf = self.__parse(conf)
+    self.stamp = self.__stamp()
+    return True
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
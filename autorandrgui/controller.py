@@ -16,65 +16,85 @@
 # See the Licence for the specific language governing permissions and
 # limitations under the Licence.
 
-import autorandr
+import headless
+import instance
+import launcher
+import watcher
+import worker
 import gui
+import runner
 import wx
 import logging
-from optparse import OptionParser # depreciated in python 2.7+
+import os
+
+""" More profiles than this are shown in a virtual list. Can be changed with
+virtuallist_threshold in the Helpers section of gui.ini. """
+VIRTUALLIST_THRESHOLD = 100
 
 def main():
-  """ Parses options and starts the application appropriately """
-  opts = OptionParser()
-  opts.add_option("-k", "--hotkey", dest="hotkey", action="store_true", \
-      help="Apply the most fitting profile and ask.")
-  opts.add_option("-b", "--boot", dest="boot", action="store_true", \
-      help="Apply the default profile or the most fitting.")
-  opts.add_option("-d", "--debug", dest="debug", action="store_true", \
-      help="Enable debug output.")
-  (options, args) = opts.parse_args()
-  if options.debug == True:
-    logging.basicConfig(level=logging.DEBUG)
-  else:
-    logging.basicConfig(level=logging.INFO)
-  app = wx.App(False)
-  controller = Controller()
-  if options.hotkey == True:
-    controller.HandleHotkey()
-    app.MainLoop()
-    exit()
-  elif options.boot == True:
-    controller.HandleBoot()
-    exit()
-  else: # Start GUI
-    controller.ListProfilesGUI()
-    app.MainLoop()
-
-
-class Controller:
+  """ Kept for callers of the old entry point """
+  launcher.main()
+
+
+class Controller(headless.Headless):
   """ Provides the glue between autorandr and the gui """
 
   def __init__(self):
     """ Loads the gui and the backend """
-    self.autorandr = autorandr.AutoRandR()
+    headless.Headless.__init__(self)
     self.gui = gui.ArFrame(self, None, wx.ID_ANY)
-    self.profileinfo = {}
-    self.gpuhash = self.autorandr.getgpuhash()
-
-  def SetProfile(self, name):
-    """ Load a named profile """
-    self.autorandr.setprofile(name)
-    self.__StatusChanged(self.autorandr.getactiveprofile())
-    self.autorandr.setactiveprofile(name)
-    self.__StatusChanged(name)
-    logging.debug(u"Loading profile {0}".format(name))
+    # Operations changing the display run in the background, one at a time
+    self.display = os.environ.get("DISPLAY", "")
+    self.worker = worker.Worker(wx.CallAfter, self.gui.ShowProgress)
+    self.watcher = watcher.Watcher(self.autorandr.ardir, \
+        self.autorandr.arconf, self.OnExternalChanges)
+    self.watcher.start()
+
+  def OnExternalChanges(self, changes):
+    """ Called from the watcher thread, hand over to the main loop """
+    wx.CallAfter(self.__ExternalChanges, changes)
+
+  def __ExternalChanges(self, changes):
+    """ Profiles or the configuration were changed by somebody else """
+    logging.debug(u"External changes: {0}".format(repr(changes)))
+    self.ExternalChanges(changes)
     self.ListProfilesGUI()
 
+  def SetProfile(self, name, done=None):
+    """ Load a named profile in the background. If another profile is still
+    waiting to be loaded, it is replaced by this one. Only the commands run
+    on the worker, the profile index and the configuration are used on the
+    main thread. done is called with true or false when the profile has been
+    loaded; such a load is never replaced. """
+    logging.debug(u"Loading profile {0}".format(name))
+    load = self.autorandr.prepareload(name)
+    if load is None:
+      if done:
+        done(False)
+      return
+    self.worker.submit(self.display, "apply", name, \
+        self.autorandr.loadprepared, (load,), \
+        lambda result: self.__ProfileSet(name, result, done), \
+        coalesce=done is None)
+
+  def __ProfileSet(self, name, result, done=None):
+    """ A profile has been loaded or loading it failed """
+    if not result:
+      logging.error(u"Profile {0} could not be loaded".format(name))
+    else:
+      oldone = self.autorandr.getactiveprofile()
+      self.autorandr.setactiveprofile(name)
+      self.Changed(headless.ACTIVE_CHANGED, oldone, name)
+      self.ListProfilesGUI()
+    if done:
+      done(bool(result))
+
   def UnsetActiveProfile(self):
     """ Unmark a profile as active (currently loaded) """
     oldone = self.autorandr.getactiveprofile()
     self.autorandr.setactiveprofile('')
     logging.debug(u"Profile {0} is no longer active.".format(oldone))
-    self.__StatusChanged(oldone)
+    self.Changed(headless.ACTIVE_CHANGED, oldone)
     self.ListProfilesGUI()
 
   def SetStandard(self, name):
@@ -82,22 +102,33 @@ class Controller:
     oldstandard = self.autorandr.getdefaultprofile()
     self.autorandr.setdefaultprofile(name)
     logging.debug(u"Setting standard profile to {0}".format(name))
-    self.__StatusChanged(name)
-    self.__StatusChanged(oldstandard)
+    self.Changed(headless.DEFAULT_CHANGED, oldstandard, name)
     self.ListProfilesGUI()
 
   def Delete(self, name):
     """ Delete a profile """
     self.autorandr.deleteprofile(name)
     logging.debug(u"Profile {0} has been deleted.".format(name))
-    self.__StatusChanged(name)
+    self.Changed(headless.PROFILE_DELETED, name)
     self.ListProfilesGUI()
   
   def Add(self, name, comment=None, force=False):
-    """ Save a profile """
-    self.autorandr.saveprofile(name, comment, force)
+    """ Save a profile in the background. Only autorandr -s runs on the
+    worker, the profile is completed on the main thread. """
+    if not self.autorandr.maysaveprofile(name, force):
+      return
+    self.worker.submit(self.display, "save", name, \
+        self.autorandr.runsaveprofile, (name,), \
+        lambda result: self.__Added(name, comment, result))
+
+  def __Added(self, name, comment, result):
+    """ A profile has been saved or saving it failed """
+    if not result:
+      logging.error(u"Profile {0} could not be saved".format(name))
+      return
+    self.autorandr.finishsaveprofile(name, comment)
     logging.debug(u"Profile {0} has been saved".format(name))
-    self.__StatusChanged(name)
+    self.Changed(headless.PROFILE_ADDED, name)
     self.ListProfilesGUI()
 
   def GetBackend(self):
@@ -109,137 +140,110 @@ class Controller:
     # FIXME The split breaks arguments: " -x yzblah"
     return self.autorandr.conf.get(section, entry).split(" ")
 
-  def __GetProfileInfo(self, name, detectedprofiles=None):
-    """ Gather information for a named profile """
-    try:
-      self.profileinfo[name]
-      logging.debug(u"Gathering profile information on {0}".format(name))
-    except KeyError as e:
-      self.profileinfo[name] = \
-          self.autorandr.getprofileinfo(name, detectedprofiles)
-      logging.debug(u"Information from profile {0} was not cached.".format(name))
-    return self.profileinfo[name]
-
-  def GetProfiles(self, showhidden=True):
-    """ Get all profile names. """
-    return self.__GetProfiles(showhidden)
-
-  def __GetProfiles(self, showhidden=True):
-    """ Return the names of all profiles, cached or get them. """
-    logging.debug(u"Gathering list of profiles")
-    if not hasattr(self, 'profiles'):
-      self.profiles = self.autorandr.getprofiles(showhidden)
-      logging.debug(u"List of profiles was not cached.")
-    return self.profiles
-
-  def __GetDetectedProfiles(self):
-    """ Return the detected profiles, cached or get them. """
-    logging.debug(u"Retrieving detected profiles")
-    if not hasattr(self,'detectedprofiles'):
-      logging.debug(u"Detected profiles were not in the cache.")
-      self.detectedprofiles = self.autorandr.getdetectedprofile()
-    return self.detectedprofiles
-
-  def __StatusChanged(self, name):
-    """ Remove cached profile information. """
-    logging.debug(u"Clean cached attributes")
-    try:
-      del self.profileinfo[name]
-    except KeyError as e:
-      pass
-    try:
-      del self.profiles
-    except AttributeError as e:
-      pass
-    try:
-      del self.detectedprofiles
-    except AttributeError as e:
-      pass
-
   def HandleHotkey(self):
     """ Handles the invocation via hotkey. """
     logging.debug(u"Handle invocation via hotkey")
-    # Save current settings
-    self.autorandr.saveprofile(".hotkey", None, True)
-    candidate = self.autorandr.getdefaultprofile()
-    if candidate in self.__GetDetectedProfiles():
-      # Load default profile, if it is detected
-      self.autorandr.setprofile(candidate)
-      self.autorandr.setactiveprofile(candidate)
-    elif self.__GetDetectedProfiles():
-      # Load the first detected profile
-      self.autorandr.setprofile( \
-          self.__GetDetectedProfiles()[0])
-      self.autorandr.setactiveprofile( \
-          self.__GetDetectedProfiles()[0])
-    else:
-      # Fallback
-      self.autorandr.fallback()
-      self.autorandr.setactiveprofile(None)
+    with runner.transaction("hotkey"):
+      # A running instance may have detected other monitors before
+      self.MonitorsChanged()
+      # Remember the current settings
+      snapshot = self.autorandr.snapshot()
+      if self.ApplyDetected() is None:
+        # Fallback
+        self.autorandr.fallback()
+        oldone = self.autorandr.getactiveprofile()
+        self.autorandr.setactiveprofile(None)
+        self.Changed(headless.ACTIVE_CHANGED, oldone)
     # TimeoutDialog
     dlg = gui.TimeoutDialog(None, 20)
     ret = dlg.ShowModal()
     if ret == wx.ID_NO:
-      self.autorandr.setprofile(".hotkey")
+      with runner.transaction("apply"):
+        self.autorandr.restore(snapshot)
     dlg.Destroy()
     # Display GUI
     self.ListProfilesGUI()
 
-  def HandleBoot(self):
-    """ Handles the invocation during boot """
-    logging.debug(u"Handle invocation during boot")
-    self.autorandr.saveprofile(".boot", None, True)
-    candidate = self.autorandr.getdefaultprofile()
-    if candidate in self.__GetDetectedProfiles():
-      # Load default profile, if it is detected
-      self.autorandr.setprofile(candidate)
-      self.autorandr.setactiveprofile(candidate)
-    elif self.__GetDetectedProfiles():
-      # Load the first detected profile
-      self.autorandr.setprofile( \
-          self.__GetDetectedProfiles()[0])
-      self.autorandr.setactiveprofile( \
-          self.__GetDetectedProfiles()[0])
-
+  def HandleRequest(self, verb, args):
+    """ Answers a request of another invocation on the main loop. Requests
+    which show a dialog are only started, apply is answered when the worker
+    has loaded the profile. """
+    if verb == "hotkey":
+      wx.CallAfter(self.HandleHotkey)
+      return True
+    if verb == "show":
+      self.ListProfilesGUI()
+      self.gui.Raise()
+      return True
+    if verb == "apply" and len(args) == 1 and args[0] in self.GetProfiles():
+      reply = instance.Deferred()
+      self.SetProfile(args[0], reply.finish)
+      return reply
+    return headless.Headless.HandleRequest(self, verb, args)
+
+  def GetEntry(self, name):
+    """ The data the GUI shows for a profile or None. Profiles of other
+    display adapters are shown greyed out from their summary. """
+    if not self.IsCompatible(name):
+      summary = self.GetSummary(name)
+      if summary is None:
+        return None
+      status = []
+      if name == self.autorandr.getdefaultprofile():
+        status = ['standard']
+      return { 'name': name, 'comment': summary['comment'] or '', \
+          'status': status, 'dimensions': None, 'enable': False }
+    info = self.GetProfileInfo(name, self.GetDetectedProfiles())
+    if info is None:
+      return None
+    status = []
+    if info['isdefault']:
+      status = ['standard']
+    if info['isdetected']:
+      status = status + ['detected']
+    if info['isactive']:
+      status = status + ['active']
+    if info['comment'] == None:
+      comment = ''
+    else:
+      comment = info['comment']
+    # dimensions 
+    try:
+      dimensions = []
+      for i in info['config']:
+        dimensions = dimensions + ["{0}:".format(i)] + \
+            info['config'][i]
+    except KeyError as e:
+      dimensions = None
+    return { 'name': info['name'], 'comment': comment, \
+        'status': status, 'dimensions': dimensions, 'enable': True }
 
   def ListProfilesGUI(self):
     """ Redraw the list of profiles """
     logging.debug(u"Redraw the list of profiles in the GUI")
-    # FIXME This code should probably be in gui.py
-    self.__GetProfiles(False) 
-    for i in self.gui.vertbox.GetChildren():
-      i.DeleteWindows()
-      del i
-    self.gui.vertbox.DeleteWindows()
-    if len(self.profiles) == 0:
-      self.gui.AddEmptyEntry()
-    for i in self.profiles:
-      info = self.__GetProfileInfo(i, self.__GetDetectedProfiles())
-      status = []
-      if info['isdefault']:
-        status = ['standard']
-      if info['gpuhash'] == self.gpuhash or info['gpuhash'] == None:
-        if info['isdetected']:
-          status = status + ['detected']
-        if info['isactive']:
-          status = status + ['active']
-        enable = True
-      else:
-        enable = False
-      if info['comment'] == None:
-        comment = ''
-      else:
-        comment = info['comment']
-      # dimensions 
-      try:
-        dimensions = []
-        for i in info['config']:
-          dimensions = dimensions + ["{0}:".format(i)] + \
-              info['config'][i]
-      except KeyError as e:
-        dimensions = None
-      self.gui.AddEntry(name=info['name'], comment=comment, \
-          status=status, dimensions=dimensions, enable=enable)
+    with runner.transaction("refresh"):
+      self.__ListProfiles()
+
+  def __ListProfiles(self):
+    """ Gather the profiles and hand them to the gui """
+    names = self.GetProfiles(False)
+    if self.HideIncompatible():
+      names = [ i for i in names if self.IsCompatible(i) ]
+    threshold = VIRTUALLIST_THRESHOLD
+    if self.autorandr.conf.has_option("Helpers", "virtuallist_threshold"):
+      threshold = self.autorandr.conf.getint("Helpers", \
+          "virtuallist_threshold")
+    if len(names) > threshold:
+      # Rows are filled on demand when they become visible
+      self.gui.SetVirtualEntries(names)
+      return
+    self.GetAllProfileInfo()
+    entries = []
+    for i in names:
+      entry = self.GetEntry(i)
+      if entry is not None:
+        entries.append(entry)
+    self.gui.SetEntries(entries)
 
 
 """ Load main() """
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, socket, select, logging, time, Queue
+import headless, watcher, runner
+
+""" Netlink protocol and multicast group of kernel uevents """
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1
+
+def main(replay=None, debounce=0.5):
+  """ Run the hotplug daemon until it is interrupted or the replayed events
+  are used up """
+  if replay:
+    source = ReplayUeventSource(replay)
+  else:
+    source = NetlinkUeventSource()
+  ctrl = headless.Headless()
+  d = Daemon(ctrl, source, debounce)
+  try:
+    d.run()
+  except KeyboardInterrupt:
+    pass
+  d.stop()
+
+def parseuevent(data):
+  """ Turns a kernel uevent (ACTION@DEVPATH\\0KEY=VALUE\\0...) into a dict """
+  event = {}
+  for field in data.split("\0"):
+    if "=" in field:
+      key, value = field.split("=", 1)
+      event[key] = value
+  return event
+
+def isdrmchange(event):
+  """ Returns true for the uevent the kernel sends when a connector of a
+  graphics card changes """
+  return event.get("SUBSYSTEM") == "drm" and event.get("ACTION") == "change"
+
+
+class NetlinkUeventSource:
+  """ Receives uevents from the kernel over a netlink socket """
+
+  def __init__(self):
+    """ Open and bind the netlink socket """
+    self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, \
+        NETLINK_KOBJECT_UEVENT)
+    self.sock.bind((os.getpid(), UEVENT_GROUP_KERNEL))
+
+  def receive(self, timeout):
+    """ Returns the next uevent as a dict, or None after timeout seconds """
+    if not select.select([self.sock], [], [], timeout)[0]:
+      return None
+    return parseuevent(self.sock.recv(16384))
+
+  def close(self):
+    """ Close the socket """
+    self.sock.close()
+
+
+class ReplayUeventSource:
+  """ Reads uevents from a file instead of the kernel, for testing. The file
+  contains blocks of KEY=VALUE lines separated by empty lines, like the output
+  of "udevadm monitor --kernel --property"; other lines are ignored. A line
+  "sleep SECONDS" pauses the replay. """
+
+  def __init__(self, filename):
+    """ Open the file """
+    self.fp = open(filename)
+
+  def receive(self, timeout):
+    """ Returns the next uevent, raises EOFError at the end of the file """
+    event = {}
+    for line in self.fp:
+      line = line.strip()
+      if line.startswith("sleep "):
+        time.sleep(float(line.split()[1]))
+      elif "=" in line:
+        key, value = line.split("=", 1)
+        event[key] = value
+      elif not line and event:
+        return event
+    if event:
+      return event
+    raise EOFError()
+
+  def close(self):
+    """ Close the file """
+    self.fp.close()
+
+
+class Daemon:
+  """ Keeps the profiles, the detection index and the gpuhash in memory and
+  loads the matching profile whenever the kernel reports a changed
+  connector. Bursts of uevents are merged: the profile is applied debounce
+  seconds after the last one. """
+
+  def __init__(self, ctrl, source, debounce=0.5):
+    """ ctrl is a headless.Headless, source an uevent source """
+    self.ctrl = ctrl
+    self.source = source
+    self.debounce = debounce
+    self.changes = Queue.Queue()
+    self.watcher = watcher.Watcher(ctrl.autorandr.ardir, \
+        ctrl.autorandr.arconf, self.changes.put)
+
+  def warmup(self):
+    """ Fill the caches before the first event arrives """
+    self.ctrl.GetProfiles()
+    self.ctrl.GetGpuHash()
+    self.ctrl.GetDetectedProfiles()
+    logging.info(u"Daemon ready, {0} profiles".format(\
+        len(self.ctrl.GetProfiles())))
+
+  def run(self):
+    """ Handle uevents until the source is exhausted """
+    self.warmup()
+    self.watcher.start()
+    deadline = None
+    while True:
+      self.__takechanges()
+      if deadline is None:
+        timeout = 1.0
+      else:
+        timeout = max(0, deadline - time.time())
+      try:
+        event = self.source.receive(timeout)
+      except EOFError:
+        if deadline is not None:
+          self.hotplug()
+        return
+      if event is not None and isdrmchange(event):
+        logging.debug(u"DRM change: {0}".format(event.get("DEVPATH")))
+        deadline = time.time() + self.debounce
+      elif deadline is not None and time.time() >= deadline:
+        deadline = None
+        self.hotplug()
+
+  def __takechanges(self):
+    """ Apply the profile changes the watcher has reported """
+    changes = []
+    while True:
+      try:
+        changes.extend(self.changes.get_nowait())
+      except Queue.Empty:
+        break
+    if changes:
+      self.ctrl.ExternalChanges(changes)
+
+  def hotplug(self):
+    """ The connected monitors changed, load the matching profile """
+    started = time.time()
+    with runner.transaction("hotplug"):
+      self.ctrl.MonitorsChanged()
+      detected = self.ctrl.GetDetectedProfiles()
+      if not detected:
+        logging.info(u"No profile matches the connected monitors")
+        return None
+      name = self.ctrl.ApplyDetected()
+    logging.info(u"Loaded profile {0} in {1:.3f}s".format(name, \
+        time.time() - started))
+    return name
+
+  def stop(self):
+    """ Stop watching and close the uevent source """
+    self.watcher.stop()
+    self.source.close()
+
+""" Load main() """
+if __name__ == "__main__":
+  logging.basicConfig(level=logging.DEBUG)
+  main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, binascii, re, sys
+
+def main():
+  """ Print the detected profiles if called directly """
+  logging.basicConfig(level=logging.DEBUG)
+  sysfsroot = "/sys"
+  if len(sys.argv) > 1:
+    sysfsroot = sys.argv[1]
+  detector = DrmDetector(os.path.expanduser(u"~/.autorandr"), sysfsroot)
+  print(repr(detector.detect()))
+
+""" DRM connector types which xrandr calls differently """
+CONNECTORTYPES = { "hdmia": "hdmi", "hdmib": "hdmi", "displayport": "dp", \
+    "dvii": "dvi", "dvid": "dvi", "dvia": "dvi" }
+
+def connectorname(name):
+  """ Maps the name of a DRM connector (card0-HDMI-A-1) or of an xrandr
+  output (HDMI1, HDMI-1) to the same name (hdmi1). The numbering of the
+  intel and modesetting drivers is assumed, which follows the kernel. Other
+  drivers count from 0 (DVI-0), their outputs map onto no connector. """
+  name = re.sub(r'^card[0-9]+-', '', name).lower().replace("-", "")
+  match = re.match(r'^(.*?)([0-9]*)$', name)
+  kind, number = match.groups()
+  return CONNECTORTYPES.get(kind, kind) + number
+
+def readsetup(filename):
+  """ Reads an autorandr setup file. Returns a sorted tuple of the connected
+  outputs as "output edid" strings, like autorandr compares them, or None
+  if the file can not be read. """
+  outputs = []
+  try:
+    with open(filename) as fp:
+      for line in fp:
+        line = line.split()
+        if len(line) >= 2:
+          outputs.append(u"{0} {1}".format(connectorname(line[0]), \
+              line[-1].lower()))
+  except IOError as e:
+    return None
+  return tuple(sorted(outputs))
+
+
+class DrmDetector:
+  """ Finds the profiles matching the connected monitors without running
+  autorandr. The EDIDs of the connected connectors are read from
+  <sysfsroot>/class/drm and compared with the setup file of every profile. """
+
+  def __init__(self, ardir, sysfsroot="/sys"):
+    """ Remember where the profiles and the sysfs tree are """
+    self.ardir = ardir
+    self.drmdir = os.path.join(sysfsroot, "class", "drm")
+    self.index = None
+    self.unmapped = []
+    self.connectornames = None
+    self.isavailable = None
+
+  def available(self):
+    """ Returns true when the kernel exposes DRM connectors with EDIDs """
+    if self.isavailable is None:
+      self.isavailable = self.__available()
+    return self.isavailable
+
+  def __available(self):
+    """ Looks for a connector with an EDID file """
+    try:
+      entries = os.listdir(self.drmdir)
+    except OSError as e:
+      logging.info(u"No DRM connectors in {0}".format(self.drmdir))
+      return False
+    for entry in entries:
+      if os.path.isfile(os.path.join(self.drmdir, entry, "edid")):
+        return True
+    logging.info(u"No DRM connector in {0} has an EDID".format(self.drmdir))
+    return False
+
+  def fingerprint(self):
+    """ Returns the connected connectors with their EDIDs as a sorted tuple
+    in the notation of readsetup """
+    outputs = []
+    for entry in sorted(os.listdir(self.drmdir)):
+      connector = os.path.join(self.drmdir, entry)
+      try:
+        with open(os.path.join(connector, "status")) as fp:
+          status = fp.readline().strip()
+        if status != "connected":
+          continue
+        with open(os.path.join(connector, "edid"), "rb") as fp:
+          edid = fp.read()
+      except IOError as e:
+        continue
+      if edid:
+        logging.debug(u"Connector {0} is connected".format(entry))
+        outputs.append(u"{0} {1}".format(connectorname(entry), \
+            binascii.hexlify(edid).lower()))
+    return tuple(sorted(outputs))
+
+  def connectors(self):
+    """ Returns the names of all DRM connectors, connected or not, in the
+    notation of connectorname """
+    if self.connectornames is None:
+      self.connectornames = set(connectorname(i) for i in \
+          os.listdir(self.drmdir) \
+          if os.path.isfile(os.path.join(self.drmdir, i, "status")))
+    return self.connectornames
+
+  def mapped(self, fingerprint):
+    """ Returns true if the outputs of a setup fingerprint are named like
+    connectors. An output which is no connector but numbered from 1 like
+    them only is not on this machine; one counted from 0 or not numbered
+    comes from a driver naming the outputs differently. """
+    connectors = self.connectors()
+    for output in fingerprint:
+      output = output.split(" ")[0]
+      number = re.search(r'[0-9]*$', output).group()
+      if output not in connectors and not (number and int(number) > 0):
+        return False
+    return True
+
+  def setupfingerprint(self, name):
+    """ Reads the setup file of a profile, see readsetup. Returns None if the
+    profile has no setup file. """
+    return readsetup(os.path.join(self.ardir, name, "setup"))
+
+  def buildindex(self, names, extra=None):
+    """ Maps the fingerprint of every given profile to the profile names.
+    extra maps the names of profiles outside ardir to their fingerprints.
+    Hidden profiles like .boot are left out, as autorandr does. Profiles
+    whose outputs are no connectors are listed in unmapped instead. """
+    index = {}
+    unmapped = []
+    fingerprints = []
+    for name in names:
+      if not name.startswith("."):
+        fingerprints.append((name, self.setupfingerprint(name)))
+    for name, fingerprint in sorted((extra or {}).items()):
+      if name not in names and not name.startswith("."):
+        fingerprints.append((name, fingerprint and tuple(fingerprint)))
+    for name, fingerprint in fingerprints:
+      if not fingerprint:
+        continue
+      if self.mapped(fingerprint):
+        index.setdefault(fingerprint, []).append(name)
+      else:
+        unmapped.append(name)
+    logging.debug(u"Indexed {0} setup fingerprints".format(len(index)))
+    if unmapped:
+      logging.info(u"The outputs of {0} are no DRM connectors".format(\
+          unmapped))
+    self.index = index
+    self.unmapped = unmapped
+    return index
+
+  def invalidate(self):
+    """ Forget the index, the next detection will rebuild it """
+    self.index = None
+    self.unmapped = []
+    self.connectornames = None
+
+  def detect(self, names=None, extra=None):
+    """ Returns the sorted names of the profiles matching the connected
+    monitors, see buildindex for extra. Returns None if the outputs of some
+    profile are no connectors, so sysfs can not tell whether it matches. """
+    if self.index is None:
+      if names is None:
+        names = [ i for i in os.listdir(self.ardir) \
+            if os.path.isdir(os.path.join(self.ardir, i)) ]
+      self.buildindex(names, extra)
+    if self.unmapped:
+      return None
+    detected = sorted(self.index.get(self.fingerprint(), []), \
+        key=unicode.lower)
+    logging.info(u"Found detected profile(s) {0}".format(detected))
+    return detected
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
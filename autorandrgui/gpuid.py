@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, json, sys, tempfile
+
+""" Version of the mapping file, a mapping of another version is discarded.
+Version 2 dropped the hashes computed with the bound drivers as markers,
+version 3 added the revision and subsystem to the fingerprint. """
+VERSION = 3
+
+""" The sysfs attributes of an adapter in the fingerprint. lspci -m, whose
+output the gpuhash covers, prints all of them. """
+ATTRIBUTES = ("vendor", "device", "revision", "subsystem_vendor", \
+    "subsystem_device")
+
+""" PCI class of a VGA compatible controller, as listed by lspci """
+VGACLASS = "0x0300"
+
+def main():
+  """ Print the sysfs fingerprint of the display adapters """
+  logging.basicConfig(level=logging.DEBUG)
+  sysfsroot = "/sys"
+  if len(sys.argv) > 1:
+    sysfsroot = sys.argv[1]
+  gpu = GpuId(os.path.expanduser(u"~/.autorandr.gpumap"), sysfsroot)
+  print(repr(gpu.fingerprint()))
+
+
+class GpuId:
+  """ Identifies the display adapters by their ATTRIBUTES and bound driver as
+  found in <sysfsroot>/bus/pci/devices. The revision and subsystem tell
+  machine models with the same chip apart, which may share the mapfile in
+  their home directory. Profiles store the older gpuhash,
+  which is a hash over lspci output. The first time a fingerprint is seen its
+  gpuhash is computed the old way and the pair is recorded in mapfile. """
+
+  def __init__(self, mapfile, sysfsroot="/sys"):
+    """ Reads the recorded mapping """
+    self.mapfile = mapfile
+    self.pcidir = os.path.join(sysfsroot, "bus", "pci", "devices")
+    self.adapters = None
+    try:
+      with open(self.mapfile) as fp:
+        data = json.load(fp)
+      self.mapping = {}
+      if data.get('version') == VERSION:
+        self.mapping = data['mapping']
+    except (IOError, ValueError, KeyError, AttributeError) as e:
+      self.mapping = {}
+
+  def __readline(self, filename):
+    """ Returns the first line of a sysfs attribute or an empty string """
+    try:
+      with open(filename) as fp:
+        return fp.readline().strip()
+    except IOError as e:
+      return ""
+
+  def scan(self):
+    """ Returns a list of (address, vendor, device, revision,
+    subsystem_vendor, subsystem_device, driver) for every VGA compatible
+    controller or None if there is no PCI sysfs tree """
+    if self.adapters is not None:
+      return self.adapters
+    try:
+      devices = sorted(os.listdir(self.pcidir))
+    except OSError as e:
+      logging.info(u"No PCI devices in {0}".format(self.pcidir))
+      return None
+    adapters = []
+    for address in devices:
+      devdir = os.path.join(self.pcidir, address)
+      if not self.__readline(os.path.join(devdir, "class")).startswith(VGACLASS):
+        continue
+      driver = ""
+      if os.path.islink(os.path.join(devdir, "driver")):
+        driver = os.path.basename(os.readlink(os.path.join(devdir, "driver")))
+      adapters.append((address,) + tuple(self.__readline(\
+          os.path.join(devdir, i)) for i in ATTRIBUTES) + (driver,))
+    logging.debug(u"Display adapters: {0}".format(repr(adapters)))
+    self.adapters = adapters
+    return adapters
+
+  def fingerprint(self):
+    """ Returns a string identifying the display adapters and their drivers
+    or None """
+    adapters = self.scan()
+    if adapters is None:
+      return None
+    return ";".join(" ".join(i) for i in adapters)
+
+  def lookup(self):
+    """ Returns the recorded gpuhash for this machine or None """
+    fingerprint = self.fingerprint()
+    if fingerprint is None:
+      return None
+    return self.mapping.get(fingerprint)
+
+  def record(self, gpuhash):
+    """ Remembers the gpuhash for the current fingerprint """
+    fingerprint = self.fingerprint()
+    if fingerprint is None or self.mapping.get(fingerprint) == gpuhash:
+      return
+    self.mapping[fingerprint] = gpuhash
+    directory = os.path.dirname(self.mapfile) or os.curdir
+    try:
+      # Other processes may record at the same time
+      fd, tmpname = tempfile.mkstemp(prefix=".autorandr.gpumap.", \
+          dir=directory)
+      try:
+        with os.fdopen(fd, "w") as fp:
+          json.dump({ 'version': VERSION, 'mapping': self.mapping }, fp)
+        os.chmod(tmpname, 0644)
+        os.rename(tmpname, self.mapfile)
+      except:
+        os.unlink(tmpname)
+        raise
+    except (IOError, OSError) as e:
+      logging.error(u"Could not write {0}".format(self.mapfile))
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
@@ -22,6 +22,7 @@ import subprocess
 import logging
 import gettext
 import os
+import cmdtrace
 
 """ Initialize I18N """
 gettext.install('autorandr-gui')
@@ -117,6 +118,190 @@ class TimeoutDialog(wx.Dialog):
     else:
       self.EndModal(wx.ID_NO)
 
+def statustext(status, enable=True):
+  """ The text describing the state of a profile """
+  if enable == False:
+    return _("Incompatible Profile")
+  statustxt = ""
+  defaulttxt = _("Default profile")
+  detectedtxt = _("Detected profile")
+  if status != None:
+    if "standard" in status:
+      statustxt = defaulttxt
+    if "detected" in status:
+      statustxt = detectedtxt
+    if ("detected" in status) and ("standard" in status) :
+      statustxt = defaulttxt + os.linesep + detectedtxt
+  return statustxt
+
+class ProfileListBox(wx.VListBox):
+  """ A list of profiles which only draws the visible rows. The data of a
+  row is requested from the controller when the row is drawn. """
+
+  def __init__(self, frame, parent):
+    """ Prepare an empty list """
+    wx.VListBox.__init__(self, parent, wx.ID_ANY, style=wx.SUNKEN_BORDER)
+    self.frame = frame
+    self.names = []
+    dc = wx.ClientDC(self)
+    dc.SetFont(frame.font)
+    self.nameheight = dc.GetTextExtent("Xg")[1]
+    dc.SetFont(frame.italfont)
+    self.lineheight = dc.GetTextExtent("Xg")[1]
+    self.SetItemCount(0)
+
+  def SetNames(self, names):
+    """ Show the profiles named in names """
+    self.names = names
+    self.SetItemCount(len(names))
+    self.RefreshAll()
+
+  def GetProfileName(self, n):
+    """ The profile name of row n """
+    return self.names[n]
+
+  def OnMeasureItem(self, n):
+    """ All rows have the same height: name, comment and dimensions """
+    return self.nameheight + 2 * self.lineheight + 12
+
+  def OnDrawSeparator(self, dc, rect, n):
+    """ Draw a line below every row """
+    dc.SetPen(wx.Pen(wx.SystemSettings_GetColour(wx.SYS_COLOUR_3DLIGHT)))
+    dc.DrawLine(rect.x, rect.y + rect.height - 1, rect.x + rect.width, \
+        rect.y + rect.height - 1)
+
+  def OnDrawItem(self, dc, rect, n):
+    """ Draw a single profile """
+    entry = self.frame.controller.GetEntry(self.names[n])
+    if entry is None:
+      return
+    if self.IsSelected(n):
+      colour = wx.SystemSettings_GetColour(wx.SYS_COLOUR_HIGHLIGHTTEXT)
+    elif entry['enable'] == False:
+      colour = wx.SystemSettings_GetColour(wx.SYS_COLOUR_GRAYTEXT)
+    else:
+      colour = wx.SystemSettings_GetColour(wx.SYS_COLOUR_WINDOWTEXT)
+    dc.SetTextForeground(colour)
+    name = entry['name']
+    if entry['status'] != None and "active" in entry['status']:
+      name = name + " " + _("(active)")
+    y = rect.y + 4
+    dc.SetFont(self.frame.font)
+    dc.DrawText(name, rect.x + 5, y)
+    y = y + self.nameheight + 2
+    dc.SetFont(self.frame.italfont)
+    dc.DrawText(entry['comment'].replace("\n", " "), rect.x + 8, y)
+    y = y + self.lineheight + 2
+    if entry['dimensions'] == None:
+      dimensions = _("Display settings unknown")
+    else:
+      dimensions = " ".join(entry['dimensions'])
+    dc.DrawText(dimensions, rect.x + 8, y)
+    statustxt = statustext(entry['status'], entry['enable'])
+    for i, line in enumerate(statustxt.splitlines()):
+      width = dc.GetTextExtent(line)[0]
+      dc.DrawText(line, rect.x + rect.width - width - 5, \
+          rect.y + 4 + i * (self.lineheight + 2))
+
+class ProfileRow:
+  """ The widgets showing a single profile in the list of the ArFrame """
+
+  def __init__(self, frame, name, data, makeline=True):
+    """ Draw the Box that contains information from a single profile """
+    logging.debug(u"Adding an entry for profile {0}".format(name))
+    parent = frame.scroll
+    self.frame = frame
+    self.name = name
+    self.data = None
+    self.hbox = wx.BoxSizer(wx.HORIZONTAL)
+    """ Define the left Text-Box """
+    txtwidth = 350
+    self.txtwidth = txtwidth
+    self.stname = wx.StaticText(parent, label=name)
+    self.stname.SetFont(frame.font)
+    self.stcomment = wx.StaticText(parent)
+    self.stdim = wx.FlexGridSizer(cols=3, vgap=1, hgap=5)
+    txtvbox = wx.BoxSizer(wx.VERTICAL)
+    txtvbox.Add(self.stname, flag=wx.TOP|wx.BOTTOM, border=1)
+    txtvbox.Add(self.stcomment, flag=wx.ALL, border=3)
+    txtvbox.Add(self.stdim, flag=wx.TOP|wx.ALL, border=3)
+    """ Define the right Button-Box """
+    self.btntxt = wx.StaticText(parent, style=wx.ALIGN_RIGHT)
+    self.btnapply = wx.Button(parent, id=wx.ID_APPLY, name=name)
+    self.btnapply.Bind(wx.EVT_BUTTON, frame.OnApply)
+    """ Define the middle Panel """
+    midpanel = wx.Panel(parent, size=(10,1))
+    """ Combine all the things """
+    self.hbox.Add(txtvbox, 0, flag=wx.ALL, border=5)
+    self.hbox.Add(midpanel, 1, flag=wx.EXPAND|wx.ALL)
+    self.hbox.Add(self.btntxt, 0, \
+        flag=wx.ALL|wx.ALIGN_CENTER_VERTICAL|wx.ALIGN_RIGHT, \
+        border=5)
+    self.hbox.Add(self.btnapply, 0, \
+        flag=wx.ALL|wx.ALIGN_CENTER_VERTICAL|wx.ALIGN_RIGHT, \
+        border=5)
+    self.line = None
+    if makeline:
+      self.line = wx.StaticLine(parent)
+    self.Update(data)
+
+  def Update(self, data):
+    """ Change the widgets to show data, a tuple of comment, status,
+    dimensions and enable. Returns False if nothing had to be changed. """
+    if data == self.data:
+      return False
+    logging.debug(u"Updating the entry for profile {0}".format(self.name))
+    comment, status, dimensions, enable = data
+    if self.data is None or self.data[0] != comment:
+      self.stcomment.SetLabel(comment)
+      self.stcomment.Wrap(self.txtwidth)
+    if self.data is None or self.data[2] != dimensions:
+      self.__SetDimensions(dimensions)
+    statustxt = statustext(status, enable)
+    if status != None and "active" in status:
+      self.btnapply.SetLabel(wx.GetStockLabel(wx.ID_REFRESH))
+      self.stname.SetLabel(self.name + " " + _("(active)"))
+    else:
+      self.btnapply.SetLabel(wx.GetStockLabel(wx.ID_APPLY))
+      self.stname.SetLabel(self.name)
+    self.stname.Wrap(self.txtwidth)
+    if enable == False:
+      self.btnapply.Disable()
+    else:
+      self.btnapply.Enable()
+    self.btntxt.SetLabel(statustxt)
+    self.data = data
+    return True
+
+  def __SetDimensions(self, dimensions):
+    """ Fill the grid with the outputs, modes and positions """
+    parent = self.frame.scroll
+    self.stdim.Clear(True)
+    if dimensions == None:
+      txt = wx.StaticText(parent, label=_("Display settings unknown"))
+      txt.SetFont(self.frame.italfont)
+      self.stdim.Add(txt)
+      return
+    for i in range(len(dimensions)):
+      txt = wx.StaticText(parent, label=dimensions[i])
+      txt.SetToolTipString(str(i))
+      txt.SetFont(self.frame.italfont)
+      if i % 3 == 1:
+        sty = wx.ALIGN_CENTER
+      elif i % 3 == 0:
+        sty = wx.ALIGN_RIGHT
+      else:
+        sty = wx.ALIGN_LEFT
+        txt.SetForegroundColour( \
+            wx.SystemSettings_GetColour(wx.SYS_COLOUR_GRAYTEXT))
+      self.stdim.Add(txt, flag=sty)
+
+  def Destroy(self):
+    """ Destroy all widgets of the row, the sizer is left to its parent """
+    self.hbox.DeleteWindows()
+    if self.line:
+      self.line.Destroy()
+
 class ArFrame(wx.Frame):
   """ Main GUI """
 
@@ -132,8 +317,14 @@ class ArFrame(wx.Frame):
     self.italfont = wx.SystemSettings_GetFont(wx.SYS_SYSTEM_FONT)
     self.italfont.SetPointSize(int(0.8 * float(self.italfont.GetPointSize()) ))
     #self.italfont.SetStyle(wx.FONTSTYLE_ITALIC)
+    self.rows = {}
+    self.order = []
+    self.emptyentry = None
+    self.allnames = []
     self.__toolbar()
     self.__vertbox()
+    self.__virtualbox()
+    self.statusbar = self.CreateStatusBar()
 
 
   def __toolbar(self):
@@ -185,94 +376,163 @@ class ArFrame(wx.Frame):
     sb.Add( self.scroll, proportion = 1, flag = wx.EXPAND | wx.ALL )
 
     self.SetSizer(sb)
+    self.sb = sb
     self.Layout()
 
+  def __virtualbox(self):
+    """ Create the list used for large numbers of profiles. It is hidden
+    until SetVirtualEntries is called. """
+    self.vpanel = wx.Panel(self, wx.ID_ANY)
+    vbox = wx.BoxSizer(wx.VERTICAL)
+    self.filter = wx.SearchCtrl(self.vpanel, wx.ID_ANY)
+    self.filter.SetDescriptiveText(_("Filter by name or comment"))
+    self.vlist = ProfileListBox(self, self.vpanel)
+    btnapply = wx.Button(self.vpanel, id=wx.ID_APPLY)
+    vbox.Add(self.filter, flag=wx.EXPAND|wx.ALL, border=5)
+    vbox.Add(self.vlist, proportion=1, flag=wx.EXPAND|wx.LEFT|wx.RIGHT, \
+        border=5)
+    vbox.Add(btnapply, flag=wx.ALL|wx.ALIGN_RIGHT, border=5)
+    self.vpanel.SetSizer(vbox)
+    self.filter.Bind(wx.EVT_TEXT, self.OnFilter)
+    self.vlist.Bind(wx.EVT_LISTBOX_DCLICK, self.OnApplySelected)
+    btnapply.Bind(wx.EVT_BUTTON, self.OnApplySelected)
+    self.sb.Add(self.vpanel, proportion=1, flag=wx.EXPAND|wx.ALL)
+    self.sb.Hide(self.vpanel)
+
+  def SetVirtualEntries(self, names):
+    """ Show the profiles in the virtual list. Only the names are needed,
+    everything else is requested from the controller for visible rows. """
+    logging.debug(u"Showing {0} profiles in the virtual list".format(\
+        len(names)))
+    if self.sb.IsShown(self.scroll):
+      for name in self.order[:]:
+        self.__RemoveRow(name)
+      if self.emptyentry is not None:
+        self.vertbox.Detach(self.emptyentry)
+        self.emptyentry.Destroy()
+        self.emptyentry = None
+      self.sb.Hide(self.scroll)
+      self.sb.Show(self.vpanel)
+      self.Layout()
+      self.SetClientSizeWH(self.toolbar.GetSize().width, 500)
+      self.Show()
+    self.allnames = names
+    self.__Filter()
+
+  def __Filter(self):
+    """ Show the names matching the filter text """
+    text = self.filter.GetValue().strip().lower()
+    if not text:
+      self.vlist.SetNames(self.allnames)
+      return
+    names = []
+    for name in self.allnames:
+      summary = self.controller.GetSummary(name)
+      comment = (summary and summary['comment']) or u""
+      if text in name.lower() or text in comment.lower():
+        names.append(name)
+    self.vlist.SetNames(names)
+
+  def OnFilter(self, e):
+    """ The filter text has changed """
+    self.__Filter()
+
+  def OnApplySelected(self, e):
+    """ Load the profile selected in the virtual list """
+    n = self.vlist.GetSelection()
+    if n == wx.NOT_FOUND:
+      return
+    name = self.vlist.GetProfileName(n)
+    entry = self.controller.GetEntry(name)
+    if entry is None or entry['enable'] == False:
+      return
+    logging.debug(u"Applying profile {0}".format(name))
+    self.controller.SetProfile(name)
+
   def AddEmptyEntry(self):
     """ Add a empty box to show that no profiles have been saved """
-    parent = self.scroll
-    msg = _("No profile saved")
-    text = wx.StaticText(parent, label=msg)
-    text.SetFont(self.font)
-    text.SetForegroundColour(wx.SystemSettings_GetColour(wx.SYS_COLOUR_GRAYTEXT))
-    self.vertbox.Add(text, flag=wx.GROW|wx.ALIGN_CENTER|wx.BOTTOM|wx.TOP, \
-        border=30)
-    print(repr(self.vertbox.GetSize()))
-    self.drawme()
+    self.SetEntries([])
 
   def AddEntry(self, name=_("Unknown"), comment=_("No comment"), \
       dimensions=None, makeline=True, status=None, enable=True):
-    parent = self.scroll
-    """ Draw the Box that contains information from a single profile """
-    logging.debug(u"Adding an entry for profile {0}".format(name))
-    hbox = wx.BoxSizer(wx.HORIZONTAL)
-    """ Define the left Text-Box """
-    txtwidth = 350
-    stname = wx.StaticText(parent, label=name)
-    stname.SetFont(self.font)
-    stname.Wrap(txtwidth)
-    stcomment = wx.StaticText(parent, label=comment)
-    stcomment.Wrap(txtwidth)
-    stdim = wx.FlexGridSizer(cols=3, vgap=1, hgap=5)
-    if dimensions == None:
-      txt = wx.StaticText(parent, label=_("Display settings unknown"))
-      txt.SetFont(self.italfont)
-      stdim.Add(txt)
-    else:
-      for i in range(len(dimensions)):
-        txt = wx.StaticText(parent, label=dimensions[i])
-        txt.SetToolTipString(str(i))
-        txt.SetFont(self.italfont)
-        if i % 3 == 1:
-          sty = wx.ALIGN_CENTER
-        elif i % 3 == 0:
-          sty = wx.ALIGN_RIGHT
-        else:
-          sty = wx.ALIGN_LEFT
-          txt.SetForegroundColour( \
-              wx.SystemSettings_GetColour(wx.SYS_COLOUR_GRAYTEXT))
-        stdim.Add(txt, flag=sty)
-    txtvbox = wx.BoxSizer(wx.VERTICAL)
-    txtvbox.Add(stname, flag=wx.TOP|wx.BOTTOM, border=1)
-    txtvbox.Add(stcomment, flag=wx.ALL, border=3)
-    txtvbox.Add(stdim, flag=wx.TOP|wx.ALL, border=3)
-    """ Define the right Button-Box """
-    statustxt = ""
-    defaulttxt = _("Default profile")
-    detectedtxt = _("Detected profile")
-    if status != None:
-      if "standard" in status:
-        statustxt = defaulttxt
-      if "detected" in status:
-        statustxt = detectedtxt
-      if ("detected" in status) and ("standard" in status) :
-        statustxt = defaulttxt + os.linesep + detectedtxt
-    btntxt = wx.StaticText(parent, label=statustxt, style=wx.ALIGN_RIGHT)
-    if status != None and "active" in status:
-      btnapply = wx.Button(parent, id=wx.ID_REFRESH, name=name)
-      stname.SetLabel(name + " " + _("(active)"))
-    else:
-      btnapply = wx.Button(parent, id=wx.ID_APPLY, name=name)
-    if enable == False:
-      btnapply.Disable()
-      btntxt.SetLabel(_("Incompatible Profile"))
-    self.Bind(wx.EVT_BUTTON, self.OnApply)
-    """ Define the middle Panel """
-    midpanel = wx.Panel(parent, size=(10,1))
-    """ Combine all the things """
-    hbox.Add(txtvbox, 0, flag=wx.ALL, border=5)
-    hbox.Add(midpanel, 1, flag=wx.EXPAND|wx.ALL)
-    hbox.Add(btntxt, 0, \
-        flag=wx.ALL|wx.ALIGN_CENTER_VERTICAL|wx.ALIGN_RIGHT, \
-        border=5)
-    hbox.Add(btnapply, 0, \
-        flag=wx.ALL|wx.ALIGN_CENTER_VERTICAL|wx.ALIGN_RIGHT, \
-        border=5)
-    self.vertbox.Add(hbox, flag=wx.EXPAND)
-    if makeline:
-      self.vertbox.Add(wx.StaticLine(parent), \
-        flag=wx.GROW|wx.ALIGN_CENTER_VERTICAL|wx.ALL, border=5)
+    """ Append the box of a single profile to the list """
+    self.__AddRow(name, (comment, status, dimensions, enable), makeline)
     self.drawme()
 
+  def SetEntries(self, entries):
+    """ Show the given profiles. entries is a list of dicts with the keys
+    name, comment, status, dimensions and enable. Only rows whose data has
+    changed are touched and the frame is laid out once. """
+    logging.debug(u"Updating the list of {0} profiles".format(len(entries)))
+    if self.sb.IsShown(self.vpanel):
+      self.sb.Hide(self.vpanel)
+      self.sb.Show(self.scroll)
+    names = [ i['name'] for i in entries ]
+    for name in self.order[:]:
+      if name not in names:
+        self.__RemoveRow(name)
+    for i in entries:
+      data = (i['comment'], i['status'], i['dimensions'], i['enable'])
+      if i['name'] in self.rows:
+        self.rows[i['name']].Update(data)
+      else:
+        self.__AddRow(i['name'], data)
+    if self.order != names:
+      self.__SortRows(names)
+    if len(entries) == 0 and self.emptyentry is None:
+      parent = self.scroll
+      msg = _("No profile saved")
+      text = wx.StaticText(parent, label=msg)
+      text.SetFont(self.font)
+      text.SetForegroundColour(wx.SystemSettings_GetColour(wx.SYS_COLOUR_GRAYTEXT))
+      self.vertbox.Add(text, flag=wx.GROW|wx.ALIGN_CENTER|wx.BOTTOM|wx.TOP, \
+          border=30)
+      self.emptyentry = text
+    elif len(entries) > 0 and self.emptyentry is not None:
+      self.vertbox.Detach(self.emptyentry)
+      self.emptyentry.Destroy()
+      self.emptyentry = None
+    self.scroll.Layout()
+    self.drawme()
+
+  def __AddRow(self, name, data, makeline=True):
+    """ Create the widgets of a profile at the end of the list """
+    row = ProfileRow(self, name, data, makeline)
+    self.vertbox.Add(row.hbox, flag=wx.EXPAND)
+    if row.line:
+      self.vertbox.Add(row.line, \
+        flag=wx.GROW|wx.ALIGN_CENTER_VERTICAL|wx.ALL, border=5)
+    self.rows[name] = row
+    self.order.append(name)
+
+  def __RemoveRow(self, name):
+    """ Destroy the widgets of a profile """
+    logging.debug(u"Removing the entry for profile {0}".format(name))
+    row = self.rows.pop(name)
+    self.order.remove(name)
+    if row.line:
+      self.vertbox.Detach(row.line)
+    row.Destroy()
+    self.vertbox.Remove(row.hbox)
+
+  def __SortRows(self, names):
+    """ Put the rows into the order of names """
+    for name in self.order:
+      row = self.rows[name]
+      self.vertbox.Detach(row.hbox)
+      if row.line:
+        self.vertbox.Detach(row.line)
+    position = 0
+    for name in names:
+      row = self.rows[name]
+      self.vertbox.Insert(position, row.hbox, flag=wx.EXPAND)
+      position += 1
+      if row.line:
+        self.vertbox.Insert(position, row.line, \
+          flag=wx.GROW|wx.ALIGN_CENTER_VERTICAL|wx.ALL, border=5)
+        position += 1
+    self.order = list(names)
+
   def OnQuit(self, e):
     self.Close()
 
@@ -283,7 +543,7 @@ class ArFrame(wx.Frame):
     else:
       launch = self.controller.GetConfig('guiconf')
     logging.debug(u"Starting {0}".format(launch))
-    exe = subprocess.Popen(launch, stdout=subprocess.PIPE)
+    exe = cmdtrace.Popen(launch, stdout=subprocess.PIPE)
     #launch = self.controller.GetConfig('postswitch')
     #exe = subprocess.Popen(launch, stdout=subprocess.PIPE)
     self.controller.UnsetActiveProfile()
@@ -318,7 +578,7 @@ class ArFrame(wx.Frame):
       select = stddlg.GetStringSelection().encode('utf-8')
       args = modes[select]
       launch = ["disper"] + args
-      exe = subprocess.Popen(launch, stdout=subprocess.PIPE)
+      exe = cmdtrace.Popen(launch, stdout=subprocess.PIPE)
       #launch = self.controller.GetConfig('postswitch')
       #exe = subprocess.Popen(launch, stdout=subprocess.PIPE)
       self.controller.UnsetActiveProfile()
@@ -352,6 +612,18 @@ class ArFrame(wx.Frame):
     dialog.Destroy()
 
 
+  def ShowProgress(self, operations):
+    """ Show the running and queued operations, a list of (kind, name) """
+    texts = { 'apply': _("Applying profile {0}"), \
+        'save': _("Saving profile {0}") }
+    labels = [ texts.get(kind, kind + " {0}").format(name) \
+        for kind, name in operations ]
+    self.statusbar.SetStatusText(", ".join(labels))
+    if operations:
+      self.SetCursor(wx.StockCursor(wx.CURSOR_ARROWWAIT))
+    else:
+      self.SetCursor(wx.NullCursor)
+
   def getbitmap(self, *args):
     """ A helper function for the toolbar """
     return wx.ArtProvider.GetBitmap(*args)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import autorandr
+import runner
+import logging
+
+""" Kinds of changes passed to Headless.Changed """
+PROFILE_ADDED = "profile-added"
+PROFILE_DELETED = "profile-deleted"
+PROFILE_RENAMED = "profile-renamed"
+PROFILE_MODIFIED = "profile-modified"
+DEFAULT_CHANGED = "default-changed"
+ACTIVE_CHANGED = "active-changed"
+HARDWARE_CHANGED = "hardware-changed"
+MONITORS_CHANGED = "monitors-changed"
+
+""" The caches each kind of change makes stale. 'info' and 'summary' only
+concern the profiles named in the change, 'allinfo' means every profile. """
+INVALIDATES = {
+    PROFILE_ADDED: ('profiles', 'info', 'summary', 'detected'),
+    PROFILE_DELETED: ('profiles', 'info', 'summary', 'detected'),
+    PROFILE_RENAMED: ('profiles', 'info', 'summary', 'detected'),
+    PROFILE_MODIFIED: ('profiles', 'info', 'summary', 'detected'),
+    DEFAULT_CHANGED: ('info',),
+    ACTIVE_CHANGED: ('info',),
+    HARDWARE_CHANGED: ('allinfo', 'detected', 'gpuhash'),
+    MONITORS_CHANGED: ('allinfo', 'detected'),
+    }
+
+class Headless:
+  """ The part of the controller which needs no wx: the cached view of the
+  profiles and the automatic profile selection for boot and hotkey mode. """
+
+  def __init__(self, sysfsroot="/sys"):
+    """ Loads the backend, see autorandr.AutoRandR for sysfsroot """
+    self.autorandr = autorandr.AutoRandR(sysfsroot)
+    self.profileinfo = {}
+    self.summaries = {}
+
+  def GetGpuHash(self):
+    """ The gpuhash of this machine, computed on first use """
+    if not hasattr(self, 'gpuhash'):
+      self.gpuhash = self.autorandr.getgpuhash()
+    return self.gpuhash
+
+  def GetProfileInfo(self, name, detectedprofiles=None):
+    """ Gather information for a named profile """
+    try:
+      self.profileinfo[name]
+      logging.debug(u"Gathering profile information on {0}".format(name))
+    except KeyError as e:
+      self.profileinfo[name] = \
+          self.autorandr.getprofileinfo(name, detectedprofiles)
+      logging.debug(u"Information from profile {0} was not cached.".format(name))
+    return self.profileinfo[name]
+
+  def GetSummary(self, name):
+    """ Name, comment and gpuhash of a profile, cached or get them """
+    if name not in self.summaries:
+      self.summaries[name] = self.autorandr.getprofilesummary(name)
+    return self.summaries[name]
+
+  def IsCompatible(self, name):
+    """ Whether a profile was saved with these display adapters or without
+    a gpuhash, from its summary """
+    summary = self.GetSummary(name)
+    if summary is None:
+      return False
+    return summary['gpuhash'] in (None, self.GetGpuHash())
+
+  def HideIncompatible(self):
+    """ Whether profiles of other display adapters are left out, set with
+    hide_incompatible in the Helpers section of gui.ini """
+    conf = self.autorandr.conf
+    return conf.has_option("Helpers", "hide_incompatible") and \
+        conf.getboolean("Helpers", "hide_incompatible")
+
+  def GetAllProfileInfo(self):
+    """ Fill the cache for all uncached profiles of these display adapters
+    in one pass. The others are only known by their summary. """
+    missing = [ i for i in self.GetProfiles(False) \
+        if i not in self.profileinfo and self.IsCompatible(i) ]
+    if not missing:
+      return self.profileinfo
+    logging.debug(u"Gathering information on {0} profiles".format(len(missing)))
+    infos = self.autorandr.getallprofileinfo(False, \
+        self.GetDetectedProfiles(), True)
+    for name in missing:
+      self.profileinfo[name] = infos.get(name)
+    return self.profileinfo
+
+  def GetProfiles(self, showhidden=True):
+    """ Return the names of all profiles, cached or get them. """
+    logging.debug(u"Gathering list of profiles")
+    if not hasattr(self, 'profiles'):
+      self.profiles = self.autorandr.getprofiles(showhidden)
+      logging.debug(u"List of profiles was not cached.")
+    return self.profiles
+
+  def GetDetectedProfiles(self):
+    """ Return the detected profiles, cached or get them. """
+    logging.debug(u"Retrieving detected profiles")
+    if not hasattr(self,'detectedprofiles'):
+      logging.debug(u"Detected profiles were not in the cache.")
+      self.detectedprofiles = self.autorandr.getdetectedprofile()
+    return self.detectedprofiles
+
+  def Changed(self, event, *names):
+    """ Drop the cached data which the change event of the kind event to the
+    profiles names can affect. """
+    caches = INVALIDATES[event]
+    logging.debug(u"{0} {1}: cleaning {2}".format(event, repr(names), \
+        repr(caches)))
+    for name in names:
+      if 'info' in caches:
+        self.profileinfo.pop(name, None)
+      if 'summary' in caches:
+        self.summaries.pop(name, None)
+    if 'allinfo' in caches:
+      self.profileinfo = {}
+    if 'profiles' in caches and hasattr(self, 'profiles'):
+      del self.profiles
+    if 'detected' in caches and hasattr(self, 'detectedprofiles'):
+      del self.detectedprofiles
+    if 'gpuhash' in caches:
+      self.autorandr.forgethardware()
+      if hasattr(self, 'gpuhash'):
+        del self.gpuhash
+
+  def ExternalChanges(self, changes):
+    """ Handle the (kind, name...) changes reported by a watcher.Watcher for
+    files written by somebody else. """
+    import watcher
+    for change in changes:
+      kind, names = change[0], change[1:]
+      if kind == watcher.CONF_CHANGED:
+        self.ConfChanged()
+        continue
+      # Files may have been rewritten without changing the directory mtime
+      for name in names:
+        self.autorandr.index.invalidate(name)
+      self.autorandr.detector.invalidate()
+      self.Changed(kind, *names)
+
+  def MonitorsChanged(self):
+    """ The connected monitors may have changed. When the display adapters
+    changed too, e.g. in a docking station with a graphics card of its own,
+    everything known about the hardware is dropped. """
+    self.Changed(MONITORS_CHANGED)
+    if self.autorandr.hardwarechanged():
+      self.Changed(HARDWARE_CHANGED)
+
+  def ConfChanged(self):
+    """ The configuration file was changed, drop the profiles that were or
+    now are the default or the active one """
+    names = [ name for name, info in self.profileinfo.items() \
+        if info and (info['isdefault'] or info['isactive']) ]
+    names.append(self.autorandr.getdefaultprofile())
+    names.append(self.autorandr.getactiveprofile())
+    self.Changed(DEFAULT_CHANGED, *names)
+
+  def ApplyDetected(self):
+    """ Load the default profile if it is detected, otherwise the first
+    detected profile. Returns the loaded profile or None. """
+    candidate = self.autorandr.getdefaultprofile()
+    detected = self.GetDetectedProfiles()
+    if candidate not in detected:
+      if not detected:
+        return None
+      candidate = detected[0]
+    self.autorandr.setprofile(candidate)
+    oldone = self.autorandr.getactiveprofile()
+    self.autorandr.setactiveprofile(candidate)
+    self.Changed(ACTIVE_CHANGED, oldone, candidate)
+    return candidate
+
+  def ListProfiles(self):
+    """ The visible profiles with their state, for the list request """
+    infos = self.GetAllProfileInfo()
+    hide = self.HideIncompatible()
+    default = self.autorandr.getdefaultprofile()
+    profiles = []
+    for name in self.GetProfiles(False):
+      if not self.IsCompatible(name):
+        summary = self.GetSummary(name)
+        if hide or summary is None:
+          continue
+        profiles.append({ 'name': name, 'comment': summary['comment'], \
+            'detected': False, 'default': name == default, 'active': False, \
+            'compatible': False })
+        continue
+      info = infos.get(name)
+      if info is None:
+        continue
+      profiles.append({ 'name': name, 'comment': info['comment'], \
+          'detected': info['isdetected'], 'default': info['isdefault'], \
+          'active': info['isactive'], 'compatible': True })
+    return profiles
+
+  def ApplyProfile(self, name):
+    """ Load a profile and mark it active """
+    with runner.transaction("apply"):
+      if not self.autorandr.setprofile(name):
+        return False
+      oldone = self.autorandr.getactiveprofile()
+      self.autorandr.setactiveprofile(name)
+      self.Changed(ACTIVE_CHANGED, oldone, name)
+    return True
+
+  def HandleRequest(self, verb, args):
+    """ Answers a request forwarded by another invocation, see instance.
+    Raises ValueError for unknown requests. """
+    if verb == "list":
+      # The monitors may have changed since the last request
+      self.MonitorsChanged()
+      return self.ListProfiles()
+    if verb == "apply":
+      if len(args) != 1:
+        raise ValueError("apply needs a profile name")
+      if args[0] not in self.GetProfiles():
+        raise ValueError(u"The profile {0} does not exist".format(args[0]))
+      return self.ApplyProfile(args[0])
+    if verb == "boot":
+      self.HandleBoot()
+      return True
+    raise ValueError(u"Unknown request {0}".format(verb))
+
+  def HandleBoot(self):
+    """ Handles the invocation during boot """
+    logging.debug(u"Handle invocation during boot")
+    with runner.transaction("boot"):
+      self.MonitorsChanged()
+      self.autorandr.saveprofile(".boot", None, True)
+      self.ApplyDetected()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, socket, threading, logging, json, sys, time
+
+""" Seconds a client waits for the answer of the running instance """
+TIMEOUT = 30.0
+
+""" Seconds the instance waits for a handler, less than TIMEOUT so the
+client still gets the reply """
+ANSWER_TIMEOUT = 25.0
+
+def main():
+  """ Send the request given as arguments to the running instance """
+  logging.basicConfig(level=logging.DEBUG)
+  print(repr(request(socketpath(), sys.argv[1], sys.argv[2:])))
+
+def socketpath(display=None, runtimedir=None):
+  """ Returns the socket of the instance for a display, or None if there is
+  no $XDG_RUNTIME_DIR to put it in """
+  if display is None:
+    display = os.environ.get("DISPLAY", "")
+  if runtimedir is None:
+    runtimedir = os.environ.get("XDG_RUNTIME_DIR")
+  if not runtimedir:
+    return None
+  return os.path.join(runtimedir, "autorandr-gui", \
+      "instance-{0}.sock".format(display.replace(os.sep, "_")))
+
+def connect(path, timeout=TIMEOUT):
+  """ Returns a socket connected to the instance or None if none runs """
+  if path is None:
+    return None
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  sock.settimeout(timeout)
+  try:
+    sock.connect(path)
+  except socket.error as e:
+    sock.close()
+    return None
+  return sock
+
+def request(path, verb, args=(), timeout=TIMEOUT):
+  """ Sends a request to the running instance. Returns its reply, a dict
+  with ok and result or error, or None if no instance answered. """
+  sock = connect(path, timeout)
+  if sock is None:
+    return None
+  logging.debug(u"Forwarding {0} to the running instance".format(verb))
+  try:
+    sock.sendall(json.dumps({ 'verb': verb, 'args': list(args) }) + "\n")
+    reply = sock.makefile().readline()
+  except socket.error as e:
+    logging.error(u"The running instance did not answer")
+    return None
+  finally:
+    sock.close()
+  try:
+    return json.loads(reply)
+  except ValueError as e:
+    logging.error(u"The running instance sent a broken reply")
+    return None
+
+
+class Deferred:
+  """ The result of a request which is only known later, e.g. when a worker
+  has finished. A handler returns it and calls finish with the result. """
+
+  def __init__(self):
+    """ Not finished yet """
+    self.event = threading.Event()
+    self.result = None
+
+  def finish(self, result):
+    """ Called with the result, on any thread """
+    self.result = result
+    self.event.set()
+
+
+class Server:
+  """ Makes this process the instance for its display. Requests are read
+  from a Unix socket, one JSON line each, and answered with one JSON line.
+  handler(verb, args) computes the answer or returns a Deferred of it; it is
+  called through dispatch, e.g. wx.CallAfter, so it runs on the thread
+  owning the state. """
+
+  def __init__(self, path, handler, dispatch=None):
+    """ Nothing is bound until start() """
+    self.path = path
+    self.handler = handler
+    self.dispatch = dispatch
+    self.sock = None
+    self.thread = None
+
+  def start(self):
+    """ Bind the socket. Returns false when another instance owns it. """
+    if self.path is None:
+      return False
+    directory = os.path.dirname(self.path)
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory, 0700)
+    except OSError as e:
+      logging.error(u"Could not create {0}".format(directory))
+      return False
+    sock = connect(self.path, 1.0)
+    if sock is not None:
+      sock.close()
+      logging.info(u"Another instance owns {0}".format(self.path))
+      return False
+    # Nobody answers, the socket is left over
+    try:
+      os.unlink(self.path)
+    except OSError as e:
+      pass
+    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      self.sock.bind(self.path)
+      os.chmod(self.path, 0600)
+      self.sock.listen(5)
+    except socket.error as e:
+      logging.info(u"Could not bind {0}".format(self.path))
+      self.sock.close()
+      self.sock = None
+      return False
+    self.thread = threading.Thread(target=self.__serve, name="instance")
+    self.thread.daemon = True
+    self.thread.start()
+    logging.debug(u"Serving requests on {0}".format(self.path))
+    return True
+
+  def stop(self):
+    """ Stop serving and remove the socket """
+    if self.sock is None:
+      return
+    try:
+      os.unlink(self.path)
+    except OSError as e:
+      pass
+    self.sock.close()
+    self.sock = None
+
+  def __serve(self):
+    """ The accept loop """
+    while self.sock is not None:
+      try:
+        conn = self.sock.accept()[0]
+      except (socket.error, AttributeError) as e:
+        return
+      try:
+        conn.settimeout(TIMEOUT)
+        line = conn.makefile().readline()
+        conn.sendall(json.dumps(self.answer(line)) + "\n")
+      except socket.error as e:
+        logging.info(u"A client went away")
+      finally:
+        conn.close()
+
+  def answer(self, line):
+    """ Handles one request line and returns the reply """
+    try:
+      req = json.loads(line)
+      verb = req['verb']
+      args = req.get('args', [])
+    except (ValueError, KeyError, TypeError) as e:
+      return { 'ok': False, 'error': "malformed request" }
+    logging.debug(u"Request {0} {1}".format(verb, repr(args)))
+    done = threading.Event()
+    reply = {}
+    def handle():
+      """ Runs on the thread of dispatch """
+      try:
+        reply['result'] = self.handler(verb, args)
+        reply['ok'] = True
+      except (ValueError, IndexError) as e:
+        reply['ok'] = False
+        reply['error'] = unicode(e)
+      except Exception as e:
+        logging.exception(u"Request {0} failed".format(verb))
+        reply['ok'] = False
+        reply['error'] = unicode(e)
+      done.set()
+    if self.dispatch is None:
+      handle()
+    else:
+      self.dispatch(handle)
+    deadline = time.time() + ANSWER_TIMEOUT
+    done.wait(ANSWER_TIMEOUT)
+    if not done.is_set():
+      return { 'ok': False, 'error': "timed out" }
+    deferred = reply.get('result')
+    if isinstance(deferred, Deferred):
+      deferred.event.wait(max(0, deadline - time.time()))
+      if not deferred.event.is_set():
+        return { 'ok': False, 'error': "timed out" }
+      reply['result'] = deferred.result
+    return reply
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import logging
+import time
+import pipes
+import atexit
+import cmdtrace
+from optparse import OptionParser # depreciated in python 2.7+
+
+""" Seconds boot mode may take before a warning is logged. Can be changed
+with boot_budget in the Helpers section of gui.ini. """
+BOOT_BUDGET = 1.0
+
+def main():
+  """ Parses options and starts the application appropriately. wx is only
+  imported for the modes which display something. """
+  started = time.time()
+  opts = OptionParser(usage="%prog [options] [apply PROFILE | list]")
+  opts.add_option("-k", "--hotkey", dest="hotkey", action="store_true", \
+      help="Apply the most fitting profile and ask.")
+  opts.add_option("-b", "--boot", dest="boot", action="store_true", \
+      help="Apply the default profile or the most fitting.")
+  opts.add_option("-d", "--debug", dest="debug", action="store_true", \
+      help="Enable debug output.")
+  opts.add_option("--dry-run", dest="dryrun", metavar="PROFILE", \
+      help="Print the commands which would load PROFILE and exit.")
+  opts.add_option("--daemon", dest="daemon", action="store_true", \
+      help="Stay running and apply the fitting profile on every hotplug.")
+  opts.add_option("--replay", dest="replay", metavar="FILE", \
+      help="Read the uevents for --daemon from FILE instead of the kernel.")
+  opts.add_option("--trace", dest="trace", metavar="FILE", \
+      help="Write a JSON timeline of all external commands to FILE.")
+  (options, args) = opts.parse_args()
+  if options.debug == True:
+    logging.basicConfig(level=logging.DEBUG)
+  else:
+    logging.basicConfig(level=logging.INFO)
+  if options.trace:
+    cmdtrace.enable(options.trace)
+    atexit.register(cmdtrace.dump)
+  if options.boot == True:
+    verb = "boot"
+  elif options.hotkey == True:
+    verb = "hotkey"
+  elif args[:1] == ["apply"] and len(args) == 2:
+    verb = "apply"
+  elif args == ["list"]:
+    verb = "list"
+  elif args:
+    opts.error("unknown command {0}".format(" ".join(args)))
+  else:
+    verb = "show"
+  verbargs = [ i.decode('utf-8') for i in args[1:] ]
+  if not (options.dryrun or options.daemon) and forward(verb, verbargs):
+    exit()
+  if options.boot == True:
+    boot(started)
+    exit()
+  if verb in ("apply", "list"):
+    import headless
+    ctrl = headless.Headless()
+    if not printreply(verb, request(ctrl, verb, verbargs)):
+      exit(1)
+    exit()
+  if options.dryrun:
+    import autorandr
+    ar = autorandr.AutoRandR()
+    for launch in ar.planprofile(options.dryrun.decode('utf-8')):
+      print(" ".join(pipes.quote(i) for i in launch))
+    exit()
+  if options.daemon == True:
+    import daemon
+    daemon.main(options.replay)
+    exit()
+  import wx
+  import controller
+  app = wx.App(False)
+  with cmdtrace.operation("startup"):
+    ctrl = controller.Controller()
+  # Later invocations are forwarded to this one
+  import instance
+  server = instance.Server(instance.socketpath(), ctrl.HandleRequest, \
+      wx.CallAfter)
+  if not server.start():
+    # Another instance may have been started in the meantime
+    if forward(verb, verbargs):
+      exit()
+    logging.warning(u"Other invocations cannot reach this instance")
+  if options.hotkey == True:
+    ctrl.HandleHotkey()
+    app.MainLoop()
+    server.stop()
+    exit()
+  else: # Start GUI
+    ctrl.ListProfilesGUI()
+    app.MainLoop()
+    server.stop()
+
+def forward(verb, args):
+  """ Hands the request to the instance running on this display. Returns
+  false if there is none. """
+  import instance
+  reply = instance.request(instance.socketpath(), verb, args)
+  if reply is None:
+    return False
+  if not printreply(verb, reply):
+    exit(1)
+  return True
+
+def request(ctrl, verb, args):
+  """ Answers a request in this process, like instance.Server would """
+  try:
+    return { 'ok': True, 'result': ctrl.HandleRequest(verb, args) }
+  except ValueError as e:
+    return { 'ok': False, 'error': unicode(e) }
+
+def printreply(verb, reply):
+  """ Prints the reply to a request, returns false if it failed """
+  if not reply.get('ok'):
+    logging.error(reply.get('error'))
+    return False
+  if verb == "list":
+    for profile in reply['result']:
+      flags = [ i for i in ('default', 'detected', 'active') if profile[i] ]
+      line = profile['name']
+      if flags:
+        line = u"{0} ({1})".format(line, ", ".join(flags))
+      print(line.encode('utf-8'))
+  elif reply['result'] is False:
+    logging.error(u"{0} failed".format(verb))
+    return False
+  return True
+
+def boot(started, sysfsroot="/sys"):
+  """ Runs boot mode without wx and checks it against the time budget """
+  import headless
+  with cmdtrace.operation("startup"):
+    ctrl = headless.Headless(sysfsroot)
+  ctrl.HandleBoot()
+  budget = BOOT_BUDGET
+  if ctrl.autorandr.conf.has_option("Helpers", "boot_budget"):
+    try:
+      budget = ctrl.autorandr.conf.getfloat("Helpers", "boot_budget")
+    except ValueError as e:
+      logging.error(u"boot_budget in gui.ini is no number, using {0}".format(\
+          BOOT_BUDGET))
+  elapsed = time.time() - started
+  if elapsed > budget:
+    logging.warning(u"Boot mode took {0:.3f}s, the budget is {1:.3f}s".format(\
+        elapsed, budget))
+  else:
+    logging.info(u"Boot mode took {0:.3f}s".format(elapsed))
+  return elapsed
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
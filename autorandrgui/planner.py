@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import logging, re, sys
+import profileconfig, runner
+
+def main():
+  """ Print the xrandr command which would load a config file """
+  logging.basicConfig(level=logging.DEBUG)
+  target = parseconfig(sys.argv[1])
+  print(repr(plan(querystate(), target)))
+
+""" How xrandr -q reports a reflection and how --reflect sets it """
+REFLECTIONS = { "X axis": "x", "Y axis": "y", "X and Y axis": "xy" }
+
+def parseconfig(filename):
+  """ Reads an autorandr config file into a dict which maps every output to
+  a dict with the keys off, mode, pos, rate, rotate, reflect and primary.
+  Returns None for auto-disper configs and for configs with settings the
+  planner does not model, e.g. panning or a missing mode; those have to be
+  loaded by autorandr. """
+  outputs = {}
+  if profileconfig.configformat(filename) != profileconfig.XRANDR:
+    return None
+  for output in profileconfig.parse(filename):
+    if output.extra:
+      logging.debug(u"{0} sets {1} for {2}, which can not be planned".format(\
+          filename, ", ".join(output.extra), output.output))
+      return None
+    if not output.off and (output.mode is None or output.position is None):
+      logging.debug(u"{0} sets no mode or position for {1}".format(filename, \
+          output.output))
+      return None
+    outputs[output.output] = { 'off': output.off, 'mode': output.mode, \
+        'pos': output.position, 'rate': output.rate, \
+        'rotate': output.rotation or "normal", 'reflect': None, \
+        'primary': output.primary }
+  return outputs
+
+def parsestate(xrandr):
+  """ Reads the output of "xrandr -q" into a dict like parseconfig. Outputs
+  without a mode are off. panning is set for outputs with panning, which
+  can not be planned. """
+  outputs = {}
+  output = None
+  header = re.compile(r'^(\S+) (connected|disconnected)( primary)?' + \
+      r'(?: (\d+x\d+)\+(\d+)\+(\d+))?(?: (normal|left|inverted|right))?' + \
+      r'(?: (X and Y axis|X axis|Y axis))?')
+  for line in xrandr.splitlines():
+    search = header.match(line)
+    if search:
+      output = { 'off': search.group(4) is None, 'mode': None, \
+          'pos': None, 'rate': None, 'rotate': search.group(7) or "normal", \
+          'reflect': REFLECTIONS.get(search.group(8)), \
+          'primary': search.group(3) is not None, \
+          'connected': search.group(2) == "connected", \
+          'panning': " panning " in line }
+      if search.group(4):
+        output['pos'] = "{0}x{1}".format(search.group(5), search.group(6))
+      outputs[search.group(1)] = output
+    elif output is not None and line[:1].isspace() and "*" in line:
+      fields = line.split()
+      output['mode'] = fields[0]
+      for rate in fields[1:]:
+        if "*" in rate:
+          output['rate'] = rate.strip("*+")
+    elif not line[:1].isspace():
+      output = None
+  return outputs
+
+def querystate():
+  """ Asks xrandr for the current configuration """
+  result = runner.run(["xrandr", "-q"])
+  out = result.out
+  if result.returncode != 0:
+    logging.error(u"xrandr -q failed")
+    return None
+  return parsestate(out)
+
+def complete(state):
+  """ Returns true if plan() can set every output of a state from
+  querystate() again """
+  for output in state.values():
+    if output.get('panning'):
+      return False
+    if not output['off'] and (output['mode'] is None or output['pos'] is None):
+      return False
+  return True
+
+def samerate(a, b):
+  """ Compares two refresh rates as xrandr prints them """
+  try:
+    return abs(float(a) - float(b)) < 0.05
+  except (TypeError, ValueError) as e:
+    return a == b
+
+def plan(current, target):
+  """ Returns the xrandr command changing the outputs in current to the
+  ones in target, or an empty list if nothing has to be changed. Outputs
+  not mentioned in target are left alone, as autorandr does. """
+  args = []
+  # --primary moves the primary output, without one it is taken away
+  if not any(want['primary'] for want in target.values() if not want['off']) \
+      and any(current[name]['primary'] for name in target if name in current):
+    args += ["--noprimary"]
+  # Outputs are switched off first to free their CRTCs
+  for name in sorted(target):
+    have = current.get(name)
+    if target[name]['off'] and have is not None and not have['off']:
+      args += ["--output", name, "--off"]
+  for name in sorted(target):
+    want = target[name]
+    have = current.get(name)
+    if want['off']:
+      continue
+    change = []
+    if have is None or have['off'] or have['mode'] != want['mode'] or \
+        have['pos'] != want['pos'] or have['rotate'] != want['rotate'] or \
+        have.get('reflect') != want.get('reflect') or \
+        (want['rate'] and not samerate(have['rate'], want['rate'])):
+      change += ["--mode", want['mode'], "--pos", want['pos'], \
+          "--rotate", want['rotate'], "--reflect", \
+          want.get('reflect') or "normal"]
+      if want['rate']:
+        change += ["--rate", want['rate']]
+    if want['primary'] and (have is None or not have['primary']):
+      change += ["--primary"]
+    if change:
+      args += ["--output", name] + change
+  if not args:
+    return []
+  return ["xrandr"] + args
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
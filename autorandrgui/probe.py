@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import logging, os, json, tempfile
+import runner
+
+""" Cache of which() results """
+whichcache = {}
+
+def which(exename):
+  """ Returns the full path of the executable exename in PATH or None. The
+  result is cached for the lifetime of the process. """
+  if exename in whichcache:
+    return whichcache[exename]
+  path = None
+  for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+    candidate = os.path.join(directory or os.curdir, exename)
+    if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+      path = candidate
+      break
+  whichcache[exename] = path
+  return path
+
+
+class Probe:
+  """ Starts a command right away and collects its output on first use, so
+  several probes can run at the same time. """
+
+  def __init__(self, launch):
+    """ Start the command, launch is a list like for subprocess.Popen """
+    self.launch = launch
+    self.out = None
+    self.pending = None
+    if not which(launch[0]):
+      logging.error(u"{0} can not be found".format(launch[0]))
+      self.out = ""
+      return
+    logging.debug(u"Starting probe {0}".format(repr(launch)))
+    self.pending = runner.start(launch)
+
+  def output(self):
+    """ Waits for the command and returns its output """
+    if self.out is None:
+      result = self.pending.result()
+      self.out = result.out
+      logging.debug(u"Probe {0} finished with {1}".format(\
+          repr(self.launch), result.returncode))
+    return self.out
+
+
+class XCapabilities:
+  """ The extensions of the X server, read with a single xdpyinfo run. The
+  result is stored per display and boot in $XDG_RUNTIME_DIR, so later
+  invocations in the same session do not need to run xdpyinfo. """
+
+  def __init__(self, display=None, runtimedir=None):
+    """ Use the stored result or start xdpyinfo in the background """
+    if display is None:
+      display = os.environ.get("DISPLAY", "")
+    if runtimedir is None:
+      runtimedir = os.environ.get("XDG_RUNTIME_DIR")
+    self.cachefile = None
+    if runtimedir and display:
+      self.cachefile = os.path.join(runtimedir, "autorandr-gui", \
+          "xcaps-{0}-{1}.json".format(display.replace(os.sep, "_"), \
+          self.bootid()))
+    self.probe = None
+    self.ext = self.load()
+    if self.ext is None:
+      self.probe = Probe(["xdpyinfo"])
+
+  def bootid(self):
+    """ Returns the id of the running boot """
+    try:
+      with open("/proc/sys/kernel/random/boot_id") as fp:
+        return fp.readline().strip()
+    except IOError as e:
+      return "unknown"
+
+  def load(self):
+    """ Returns the stored extensions or None """
+    if not self.cachefile:
+      return None
+    try:
+      with open(self.cachefile) as fp:
+        ext = frozenset(json.load(fp))
+    except (IOError, ValueError, TypeError) as e:
+      return None
+    logging.debug(u"X capabilities read from {0}".format(self.cachefile))
+    return ext
+
+  def save(self):
+    """ Stores the extensions for later invocations """
+    if not self.cachefile:
+      return
+    directory = os.path.dirname(self.cachefile)
+    try:
+      if not os.path.isdir(directory):
+        os.makedirs(directory, 0700)
+      # Other invocations may store them at the same time
+      fd, tmpname = tempfile.mkstemp(prefix=".xcaps.", dir=directory)
+      try:
+        with os.fdopen(fd, "w") as fp:
+          json.dump(sorted(self.ext), fp)
+        os.rename(tmpname, self.cachefile)
+      except:
+        os.unlink(tmpname)
+        raise
+    except (IOError, OSError) as e:
+      logging.info(u"Could not store X capabilities in {0}".format(\
+          self.cachefile))
+
+  def parse(self, xdpyinfo):
+    """ Collects the names listed after "number of extensions:" """
+    ext = set()
+    inext = False
+    for line in xdpyinfo.splitlines():
+      if line.startswith("number of extensions:"):
+        inext = True
+      elif inext and line[:1].isspace():
+        ext.add(line.strip())
+      else:
+        inext = False
+    return frozenset(ext)
+
+  def extensions(self):
+    """ Returns the names of all extensions of the X server """
+    if self.ext is None:
+      out = self.probe.output()
+      self.ext = self.parse(out)
+      if out:
+        self.save()
+    return self.ext
+
+  def has(self, name):
+    """ Returns true when the X server has the extension name """
+    return name in self.extensions()
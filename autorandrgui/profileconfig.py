@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, sys
+
+""" The formats of config files """
+XRANDR = "xrandr"
+DISPER = "disper"
+
+""" Parsed files by name: ((inode, mtime), format, records) """
+parsecache = {}
+
+def main():
+  """ Print the outputs of the given config files """
+  logging.basicConfig(level=logging.DEBUG)
+  for filename in sys.argv[1:]:
+    for record in parse(filename):
+      print(repr(record))
+
+
+class Output:
+  """ The settings of one output in a profile. position is "XxY"; it, rate,
+  rotation and mode may be None when the config does not set them.
+  extra holds the names of the other settings of the config, e.g. reflect or
+  panning, which are not modelled. """
+
+  __slots__ = ('output', 'mode', 'position', 'rate', 'rotation', 'primary', \
+      'off', 'extra')
+
+  def __init__(self, output, mode=None, position=None, rate=None, \
+      rotation=None, primary=False, off=False, extra=()):
+    """ Fill in the settings """
+    self.output = output
+    self.mode = mode
+    self.position = position
+    self.rate = rate
+    self.rotation = rotation
+    self.primary = primary
+    self.off = off
+    self.extra = extra
+
+  def __eq__(self, other):
+    return isinstance(other, Output) and \
+        all(getattr(self, i) == getattr(other, i) for i in self.__slots__)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return "Output({0})".format(", ".join("{0}={1!r}".format(i, \
+        getattr(self, i)) for i in self.__slots__))
+
+
+def parse(filename):
+  """ Returns the outputs of an autorandr or auto-disper config file as a
+  tuple of Output records. Raises IOError if the file can not be read. """
+  return __load(filename)[2]
+
+def configformat(filename):
+  """ Returns XRANDR for autorandr and DISPER for auto-disper configs """
+  return __load(filename)[1]
+
+def __load(filename):
+  """ Reads a config file, unless it is in the cache with the same inode and
+  mtime """
+  try:
+    st = os.stat(filename)
+  except OSError as e:
+    raise IOError(e.errno, e.strerror, filename)
+  stamp = (st.st_ino, st.st_mtime)
+  cached = parsecache.get(filename)
+  if cached and cached[0] == stamp:
+    return cached
+  kind = [XRANDR]
+  def lines(fp):
+    """ Notes the format while the lines are parsed """
+    for line in fp:
+      if line.startswith("metamode:"):
+        kind[0] = DISPER
+      yield line
+  with open(filename) as fp:
+    records = tuple(parselines(lines(fp)))
+  cached = (stamp, kind[0], records)
+  parsecache[filename] = cached
+  return cached
+
+def parselines(lines):
+  """ Yields an Output for every output in the lines of a config """
+  output = None
+  for line in lines:
+    line = line.split()
+    if not line:
+      continue
+    if line[0] == "metamode:":
+      for record in parsemetamode(" ".join(line[1:])):
+        yield record
+    elif line[0] == "output" and len(line) > 1:
+      if output:
+        yield output
+      output = Output(line[1])
+    elif output is None:
+      continue
+    elif line[0] == "off":
+      output.off = True
+    elif line[0] == "primary":
+      output.primary = True
+    elif line[0] == "mode" and len(line) > 1:
+      output.mode = line[1]
+    elif line[0] == "pos" and len(line) > 1:
+      output.position = line[1]
+    elif line[0] == "rate" and len(line) > 1:
+      output.rate = line[1]
+    elif line[0] == "rotate" and len(line) > 1:
+      output.rotation = line[1]
+    else:
+      output.extra = output.extra + (line[0],)
+  if output:
+    yield output
+
+def parsemetamode(metamode):
+  """ Yields an Output for every display of a nvidia metamode like
+  "DFP-0: nvidia-auto-select @1920x1080 +0+0, DFP-1: ..." """
+  for display in metamode.split(","):
+    fields = display.split()
+    if len(fields) < 4:
+      logging.debug(u"Skipping metamode part {0}".format(repr(display)))
+      continue
+    position = fields[3].strip().lstrip("+").replace("+", "x", 1)
+    yield Output(fields[0].strip(":").strip(), \
+        mode=fields[2].strip("@").strip(), position=position)
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
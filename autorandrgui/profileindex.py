@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, json, codecs, tempfile
+import profileconfig
+
+VERSION = 4
+
+""" The files of a profile whose mtimes an entry is checked against, since
+autorandr rewrites them in place without touching the directory """
+STAMPED = ("config", "comment", "gpuhash")
+
+def main():
+  """ Print the index of ~/.autorandr if called directly """
+  logging.basicConfig(level=logging.DEBUG)
+  ardir = os.path.expanduser(u"~/.autorandr")
+  index = ProfileIndex(ardir, ardir + u".index")
+  for name in index.names():
+    print(repr(index.entry(name)))
+  index.save()
+
+def readfirstline(filename):
+  """ Reads the first line of a file or returns None """
+  try:
+    with open(filename) as fp:
+      return fp.readline().strip()
+  except IOError as e:
+    return None
+
+def parseconfig(filename):
+  """ Parses a autorandr or auto-disper config file into a dict which maps
+  each output that is not switched off to a list of its mode and position """
+  config = {}
+  for output in profileconfig.parse(filename):
+    if output.off:
+      continue
+    if output.position in (None, "0x0"):
+      position = ""
+    else:
+      position = output.position
+    config[output.output] = [ output.mode or "", position ]
+  return config
+
+def readsummary(profiledir):
+  """ Reads the comment and gpuhash of a profile directory into a dict
+  without opening its config. Raises IOError if it has no config. """
+  if not os.path.isfile(profiledir + os.sep + "config"):
+    raise IOError("{0} has no config".format(profiledir))
+  return { 'comment': readfirstline(profiledir + os.sep + 'comment'), \
+      'gpuhash': readfirstline(profiledir + os.sep + 'gpuhash') }
+
+def readprofile(profiledir):
+  """ Reads the comment, gpuhash and outputs of a profile directory into a
+  dict. Raises IOError if it has no readable config. """
+  entry = readsummary(profiledir)
+  entry['config'] = parseconfig(profiledir + os.sep + "config")
+  return entry
+
+
+class ProfileIndex:
+  """ Keeps the metadata of all profiles in ~/.autorandr in a file, so the
+  profiles do not have to be listed and read on every start. An entry is only
+  read again when the mtime of its profile directory or of one of its
+  STAMPED files changed. Listing the
+  profiles only reads their comment and gpuhash, the config of a profile is
+  parsed when its full entry is asked for. """
+
+  def __init__(self, ardir, indexfile):
+    """ Load the index file if there is one """
+    self.ardir = ardir
+    self.indexfile = indexfile
+    self.dirty = False
+    # Counts the rescans of the listing, for caches derived from it
+    self.generation = 0
+    self.load()
+
+  def load(self):
+    """ Reads the index file, an unreadable index is just rebuilt """
+    self.mtime = None
+    self.entries = {}
+    try:
+      with codecs.open(self.indexfile, encoding='utf-8') as fp:
+        data = json.load(fp)
+      if data.get('version') == VERSION:
+        self.mtime = data['mtime']
+        self.entries = data['entries']
+        logging.debug(u"Loaded {0} profiles from the index {1}".format(\
+            len(self.entries), self.indexfile))
+    except (IOError, ValueError, KeyError, AttributeError) as e:
+      logging.info(u"No usable profile index {0}".format(self.indexfile))
+
+  def save(self):
+    """ Writes the index file, if anything has changed """
+    if not self.dirty:
+      return True
+    data = { 'version': VERSION, 'mtime': self.mtime, \
+        'entries': self.entries }
+    directory = os.path.dirname(self.indexfile) or os.curdir
+    try:
+      # Other processes may save the index at the same time
+      fd, tmpname = tempfile.mkstemp(prefix=".autorandr.index.", \
+          dir=directory)
+      try:
+        with os.fdopen(fd, 'w') as fp:
+          json.dump(data, fp)
+        os.chmod(tmpname, 0644)
+        os.rename(tmpname, self.indexfile)
+      except:
+        os.unlink(tmpname)
+        raise
+    except (IOError, OSError) as e:
+      logging.error(u"Could not write the profile index {0}".format(\
+          self.indexfile))
+      return False
+    self.dirty = False
+    return True
+
+  def __stat(self, path):
+    """ Returns the mtime of path or None """
+    try:
+      return os.stat(path).st_mtime
+    except OSError as e:
+      return None
+
+  def __profilestamp(self, profiledir):
+    """ The mtimes of a profile directory and its STAMPED files as a list,
+    None if there is no such directory """
+    mtime = self.__stat(profiledir)
+    if mtime is None:
+      return None
+    return [ mtime ] + [ self.__stat(profiledir + os.sep + i) \
+        for i in STAMPED ]
+
+  def names(self):
+    """ Returns the names of all profiles, hidden ones included """
+    mtime = self.__stat(self.ardir)
+    if mtime is not None and mtime == self.mtime:
+      return self.entries.keys()
+    logging.debug(u"Profile directory {0} changed, rescanning".format(\
+        self.ardir))
+    entries = {}
+    for entry in os.listdir(self.ardir):
+      profiledir = self.ardir + os.sep + entry
+      if not os.path.isdir(profiledir):
+        continue
+      if entry in self.entries:
+        entries[entry] = self.entries[entry]
+      else:
+        entries[entry] = None
+    self.entries = entries
+    for entry in entries.keys():
+      self.summary(entry)
+    self.entries = dict((k, v) for k, v in self.entries.items() if v)
+    self.mtime = mtime
+    self.dirty = True
+    self.generation += 1
+    return self.entries.keys()
+
+  def compatible(self, gpuhash):
+    """ Returns the names of the profiles saved with the display adapters
+    gpuhash or without a gpuhash """
+    groups = self.bygpuhash()
+    names = groups.get(None, [])
+    if gpuhash is not None:
+      names = groups.get(gpuhash, []) + names
+    return names
+
+  def bygpuhash(self):
+    """ Returns the names of all profiles grouped by their gpuhash """
+    groups = {}
+    for name in self.names():
+      groups.setdefault(self.entries[name]['gpuhash'], []).append(name)
+    return groups
+
+  def summary(self, name):
+    """ Returns the comment and gpuhash of a profile like entry(), without
+    parsing its config """
+    stamp = self.__profilestamp(self.ardir + os.sep + name)
+    cached = self.entries.get(name)
+    if cached and stamp is not None and cached['stamp'] == stamp:
+      return cached
+    return self.__store(name, self.__read(name, stamp, False))
+
+  def entry(self, name):
+    """ Returns the metadata of a profile or None if it is no profile """
+    profiledir = self.ardir + os.sep + name
+    stamp = self.__profilestamp(profiledir)
+    cached = self.entries.get(name)
+    if cached and stamp is not None and cached['stamp'] == stamp:
+      if 'config' in cached:
+        return cached
+      try:
+        cached['config'] = parseconfig(profiledir + os.sep + "config")
+        self.dirty = True
+        return cached
+      except IOError as e:
+        stamp = None
+    return self.__store(name, self.__read(name, stamp))
+
+  def __store(self, name, entry):
+    """ Puts what was read of a profile into the index """
+    if entry:
+      self.entries[name] = entry
+    elif name in self.entries:
+      del self.entries[name]
+    self.dirty = True
+    return entry
+
+  def __read(self, name, stamp, config=True):
+    """ Reads the files of a profile, without config only the summary """
+    if stamp is None:
+      return None
+    profiledir = self.ardir + os.sep + name
+    logging.debug(u"Reading profile {0} into the index".format(name))
+    try:
+      if config:
+        entry = readprofile(profiledir)
+      else:
+        entry = readsummary(profiledir)
+    except IOError as e:
+      return None
+    entry['stamp'] = stamp
+    return entry
+
+  def invalidate(self, name=None):
+    """ Forces a profile or, without a name, the listing to be read again """
+    if name is None:
+      self.mtime = None
+    elif self.entries.get(name):
+      self.entries[name]['stamp'] = None
+    self.dirty = True
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
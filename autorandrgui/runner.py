@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import subprocess, threading, logging, sys, os, signal, time
+from contextlib import contextmanager
+import cmdtrace
+
+""" Seconds a probe or disper may run before it is killed. Can be changed
+with command_timeout in the Helpers section of gui.ini. """
+TIMEOUT = 30.0
+
+""" Commands which only report the state and may be answered from the cache.
+Everything else may change the state and empties the cache. """
+READONLY = frozenset([ ("autorandr",), ("auto-disper",), ("xrandr", "-q"), \
+    ("xdpyinfo",), ("lspci", "-m") ])
+
+""" Commands besides the read-only ones which are killed after the timeout.
+autorandr -s/-l and the postswitch hooks may legitimately take long. """
+TIMED = frozenset([ "disper" ])
+
+def main():
+  """ Run the command line given as arguments twice in one transaction """
+  logging.basicConfig(level=logging.DEBUG)
+  with transaction("test"):
+    for i in range(2):
+      result = run(sys.argv[1:])
+      print(repr((result.returncode, len(result.out), result.timedout)))
+
+
+class Result:
+  """ The outcome of a command. returncode is None if it could not be
+  started. """
+
+  def __init__(self, launch, returncode, out, err, timedout=False):
+    """ Store the outcome """
+    self.launch = launch
+    self.returncode = returncode
+    self.out = out
+    self.err = err
+    self.timedout = timedout
+
+
+class Pending:
+  """ A started command. Its result is collected once, by whoever asks for
+  it first. It is killed when it has not finished timeout seconds after it
+  was started; the timer only runs while somebody waits for the result. """
+
+  def __init__(self, runner, launch, timeout, stdin=None, generation=0):
+    """ Start the command. generation is the one of the runner when it was
+    started. """
+    self.runner = runner
+    self.launch = launch
+    self.generation = generation
+    self.stdin = stdin
+    self.lock = threading.Lock()
+    self.timeout = timeout
+    self.timedout = False
+    self.done = None
+    self.started = time.time()
+    stdinpipe = None
+    if stdin is not None:
+      stdinpipe = subprocess.PIPE
+    try:
+      # In a process group of its own, so children of scripts die with them
+      self.exe = cmdtrace.Popen(launch, stdin=stdinpipe, \
+          stdout=subprocess.PIPE, stderr=subprocess.PIPE, \
+          preexec_fn=os.setpgrp)
+    except OSError as e:
+      logging.error(u"Could not start {0}".format(launch[0]))
+      self.exe = None
+      self.done = Result(launch, None, "", "")
+
+  def __kill(self):
+    """ Called by the timer """
+    logging.error(u"{0} did not finish within {1}s, killing it".format(\
+        " ".join(self.launch), self.timeout))
+    self.timedout = True
+    try:
+      os.killpg(self.exe.pid, signal.SIGKILL)
+    except OSError as e:
+      pass
+
+  def result(self):
+    """ Waits for the command and returns its Result """
+    with self.lock:
+      if self.done is None:
+        timer = None
+        if self.timeout:
+          timer = threading.Timer(max(0, self.started + self.timeout - \
+              time.time()), self.__kill)
+          timer.daemon = True
+          timer.start()
+        out, err = self.exe.communicate(self.stdin)
+        if timer:
+          # Let the timer thread end before the interpreter may exit
+          timer.cancel()
+          timer.join()
+        for line in err.splitlines():
+          logging.debug(u"{0}: {1}".format(self.launch[0], \
+              line.decode('utf-8', 'replace')))
+        self.done = Result(self.launch, self.exe.returncode, out, err, \
+            self.timedout)
+        self.runner.finished(self)
+    return self.done
+
+
+class Runner:
+  """ Runs external commands, the probes and disper with a timeout.
+  Read-only commands (READONLY) which are asked for while the same command
+  is still running share its result. Within a scope() of a thread their
+  results are also kept, so a refresh or a hotkey transaction runs each of
+  them only once. Any other command may change what they report; it starts
+  a new generation, and results of an older one are neither kept nor
+  shared. """
+
+  def __init__(self, timeout=TIMEOUT):
+    """ Nothing is cached outside of a scope """
+    self.timeout = timeout
+    self.lock = threading.Lock()
+    self.generation = 0
+    self.inflight = {}
+    # depth and memo of the scopes of each thread
+    self.local = threading.local()
+
+  def readonly(self, launch, stdin=None):
+    """ Returns true when the command may be answered from the cache """
+    return stdin is None and tuple(launch) in READONLY
+
+  def timeoutfor(self, launch, stdin=None):
+    """ The timeout of a command without an explicit one, None for none """
+    if self.readonly(launch, stdin) or launch[0] in TIMED:
+      return self.timeout
+    return None
+
+  def __memo(self):
+    """ The cache of the scope of this thread or None outside of one. Its
+    entries are only valid while their generation is the current one. """
+    if getattr(self.local, "depth", 0) == 0:
+      return None
+    return self.local.memo
+
+  @contextmanager
+  def scope(self):
+    """ Read-only commands run at most once within, nested scopes share the
+    cache of the outermost one. Every thread has scopes of its own. """
+    if getattr(self.local, "depth", 0) == 0:
+      self.local.depth = 0
+      self.local.memo = {}
+    self.local.depth += 1
+    try:
+      yield
+    finally:
+      self.local.depth -= 1
+      if self.local.depth == 0:
+        self.local.memo = {}
+
+  def start(self, launch, timeout=None, stdin=None):
+    """ Start a command in the background and return its Pending. A
+    read-only command that is running or cached is not started again. """
+    if timeout is None:
+      timeout = self.timeoutfor(launch, stdin)
+    if not self.readonly(launch, stdin):
+      with self.lock:
+        logging.debug(u"{0} may change the state, emptying the cache"\
+            .format(launch[0]))
+        self.generation += 1
+        generation = self.generation
+      return Pending(self, launch, timeout, stdin, generation)
+    key = tuple(launch)
+    memo = self.__memo()
+    with self.lock:
+      pending = None
+      if memo is not None:
+        pending = memo.get(key)
+      if pending is None:
+        pending = self.inflight.get(key)
+      if pending is not None and (pending.timedout or \
+          pending.generation != self.generation):
+        pending = None
+      if pending is None:
+        pending = Pending(self, launch, timeout, None, self.generation)
+        if pending.done is None:
+          self.inflight[key] = pending
+      else:
+        logging.debug(u"Reusing the result of {0}".format(" ".join(launch)))
+        cmdtrace.tracer.cached(launch)
+      if memo is not None and pending.exe is not None:
+        memo[key] = pending
+    return pending
+
+  def run(self, launch, timeout=None, stdin=None):
+    """ Run a command and return its Result """
+    return self.start(launch, timeout, stdin).result()
+
+  def finished(self, pending):
+    """ Called by a Pending when its result has been collected """
+    key = tuple(pending.launch)
+    with self.lock:
+      if self.inflight.get(key) is pending:
+        del self.inflight[key]
+
+
+""" The runner of this process """
+runner = Runner()
+
+def run(launch, timeout=None, stdin=None):
+  """ See Runner.run """
+  return runner.run(launch, timeout, stdin)
+
+def start(launch, timeout=None, stdin=None):
+  """ See Runner.start """
+  return runner.start(launch, timeout, stdin)
+
+@contextmanager
+def transaction(name):
+  """ A traced operation in which read-only commands run only once """
+  with cmdtrace.operation(name):
+    with runner.scope():
+      yield
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
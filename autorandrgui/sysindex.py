@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, logging, json, struct, mmap, tempfile, sys, hashlib
+import profileindex, detect
+
+""" The profiles shipped by the administrator and their compiled index. The
+index is written by running this module, e.g. when the package is
+installed or the profiles are changed. """
+PROFILEDIR = "/etc/autorandr/profiles"
+INDEXFILE = "/var/cache/autorandr-gui/system.index"
+
+""" Layout of the index: the header, one table row per profile sorted by
+name, then the names and the JSON encoded entries the rows point to. A row
+also holds the gpuhash of its profile, so profiles of other display
+adapters can be skipped without decoding them. The header holds the
+stamp() of the profiles the index was built from. """
+MAGIC = "ARGUIX04"
+HEADER = struct.Struct("<8s16sI")
+ROW = struct.Struct("<IIII32s")
+
+""" The files of a profile which are compiled into the index """
+FILES = ("config", "setup", "comment", "gpuhash")
+
+def main():
+  """ Compile the index of the system profiles:
+  sysindex.py [PROFILEDIR [INDEXFILE]] """
+  logging.basicConfig(level=logging.INFO)
+  profiledir = PROFILEDIR
+  indexfile = INDEXFILE
+  if len(sys.argv) > 1:
+    profiledir = sys.argv[1]
+  if len(sys.argv) > 2:
+    indexfile = sys.argv[2]
+  if not write(profiledir, indexfile):
+    sys.exit(1)
+
+def stamp(profiledir):
+  """ A digest of the names of the profiles in profiledir and the mtimes of
+  their directories and FILES. Editing a file in place does not change
+  the mtime of its profile directory, so the files are looked at too. """
+  digest = hashlib.md5()
+  for name in sorted(os.listdir(profiledir)):
+    path = os.path.join(profiledir, name)
+    if not os.path.isdir(path):
+      continue
+    mtimes = []
+    for filename in ("",) + FILES:
+      try:
+        mtimes.append(os.stat(os.path.join(path, filename)).st_mtime)
+      except OSError as e:
+        mtimes.append(None)
+    digest.update(repr((name, mtimes)))
+  return digest.digest()
+
+def build(profiledir):
+  """ Reads every profile in profiledir and returns the index as a string """
+  # Before reading, so a profile changed meanwhile makes the index stale
+  built = stamp(profiledir)
+  entries = []
+  for name in os.listdir(profiledir):
+    path = os.path.join(profiledir, name)
+    if not os.path.isdir(path):
+      continue
+    try:
+      entry = profileindex.readprofile(path)
+    except IOError as e:
+      logging.error(u"Ignoring the damaged system profile {0}".format(name))
+      continue
+    entry['setup'] = detect.readsetup(os.path.join(path, "setup"))
+    if isinstance(name, unicode):
+      name = name.encode('utf-8')
+    gpuhash = (entry['gpuhash'] or u"").encode('utf-8')
+    entries.append((name, gpuhash, json.dumps(entry)))
+  entries.sort()
+  offset = HEADER.size + ROW.size * len(entries)
+  rows = []
+  blobs = []
+  for name, gpuhash, data in entries:
+    rows.append(ROW.pack(offset, len(name), offset + len(name), len(data), \
+        gpuhash))
+    blobs += [name, data]
+    offset += len(name) + len(data)
+  return HEADER.pack(MAGIC, built, len(entries)) + "".join(rows) + \
+      "".join(blobs)
+
+def write(profiledir, indexfile):
+  """ Compiles the index and replaces indexfile with it """
+  try:
+    data = build(profiledir)
+    directory = os.path.dirname(indexfile)
+    if not os.path.isdir(directory):
+      os.makedirs(directory, 0755)
+    fd, tmpname = tempfile.mkstemp(prefix=".system.index.", dir=directory)
+    with os.fdopen(fd, "wb") as fp:
+      fp.write(data)
+    os.chmod(tmpname, 0644)
+    os.rename(tmpname, indexfile)
+  except (IOError, OSError) as e:
+    logging.error(u"Could not write {0}: {1}".format(indexfile, e))
+    return False
+  logging.info(u"Wrote the index of {0} system profiles to {1}".format(\
+      SystemIndex(data).count, indexfile))
+  return True
+
+def load(profiledir=PROFILEDIR, indexfile=INDEXFILE):
+  """ Returns the SystemIndex of profiledir, or None if there is no such
+  directory. The compiled index file is mapped into memory if it is up to
+  date, i.e. no profile was added, removed or changed since it was built;
+  otherwise the profiles are read, which is much slower. """
+  try:
+    current = stamp(profiledir)
+  except OSError as e:
+    return None
+  try:
+    with open(indexfile, "rb") as fp:
+      data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    index = SystemIndex(data)
+    if index.stamp == current:
+      logging.debug(u"Mapped the system index {0}".format(indexfile))
+      return index
+    logging.info(u"The system index {0} is out of date".format(indexfile))
+  except (IOError, ValueError, mmap.error, struct.error) as e:
+    logging.info(u"No usable system index {0}".format(indexfile))
+  try:
+    return SystemIndex(build(profiledir))
+  except OSError as e:
+    return None
+
+
+class SystemIndex:
+  """ Read-only access to a compiled index. data is a string or a memory
+  map of it, entries are only decoded when they are asked for. """
+
+  def __init__(self, data):
+    """ Check the header """
+    magic, self.stamp, self.count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+      raise ValueError("not a system profile index")
+    self.data = data
+    self.cache = {}
+
+  def __row(self, i):
+    """ The name and the location of the entry of row i """
+    nameoff, namelen, dataoff, datalen, gpuhash = ROW.unpack_from(\
+        self.data, HEADER.size + ROW.size * i)
+    return self.data[nameoff:nameoff + namelen], dataoff, datalen
+
+  def __gpuhash(self, i):
+    """ The gpuhash of row i or None """
+    gpuhash = ROW.unpack_from(self.data, HEADER.size + ROW.size * i)[4]
+    return gpuhash.rstrip("\0").decode('utf-8') or None
+
+  def names(self):
+    """ Returns the names of all system profiles """
+    return [ self.__row(i)[0].decode('utf-8') for i in range(self.count) ]
+
+  def __find(self, name):
+    """ Binary search for the row of name, returns (offset, length) """
+    if isinstance(name, unicode):
+      name = name.encode('utf-8')
+    low, high = 0, self.count
+    while low < high:
+      middle = (low + high) // 2
+      rowname, dataoff, datalen = self.__row(middle)
+      if rowname == name:
+        return dataoff, datalen
+      if rowname < name:
+        low = middle + 1
+      else:
+        high = middle
+    return None
+
+  def entry(self, name):
+    """ Returns the entry of a system profile like ProfileIndex.entry, with
+    the EDIDs of its setup file as 'setup', or None """
+    if name not in self.cache:
+      found = self.__find(name)
+      if found is None:
+        return None
+      dataoff, datalen = found
+      self.cache[name] = json.loads(self.data[dataoff:dataoff + datalen])
+    return self.cache[name]
+
+  def compatible(self, gpuhash):
+    """ Returns the names of the system profiles saved with the display
+    adapters gpuhash or without a gpuhash """
+    return [ self.__row(i)[0].decode('utf-8') for i in range(self.count) \
+        if self.__gpuhash(i) in (None, gpuhash) ]
+
+  def fingerprints(self, names=None):
+    """ Maps the names of the given or all system profiles to their setup
+    EDIDs """
+    if names is None:
+      names = self.names()
+    return dict((name, self.entry(name)['setup']) for name in names)
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
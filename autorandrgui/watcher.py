@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, logging, threading, select, struct, errno, time
+import ctypes, ctypes.util
+import headless
+
+""" The configuration file changed. Sent with the name None. """
+CONF_CHANGED = "conf-changed"
+
+""" inotify constants from <sys/inotify.h> """
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 00004000
+IN_CLOEXEC = 02000000
+
+EVENTHEADER = struct.Struct("iIII")
+
+def main():
+  """ Print the changes in ~/.autorandr if called directly """
+  logging.basicConfig(level=logging.DEBUG)
+  def show(changes):
+    print(repr(changes))
+  ardir = os.path.expanduser(u"~/.autorandr")
+  poll = len(sys.argv) > 1 and sys.argv[1] == "--poll"
+  watcher = Watcher(ardir, ardir + u".conf", show, poll=poll)
+  watcher.start()
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    watcher.stop()
+
+
+class Inotify:
+  """ A thin ctypes wrapper around the inotify system calls """
+
+  def __init__(self):
+    """ Create the inotify instance, raises OSError if that fails """
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    self.addwatch = libc.inotify_add_watch
+    self.addwatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    self.rmwatch = libc.inotify_rm_watch
+    self.rmwatch.argtypes = [ctypes.c_int, ctypes.c_int]
+    self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.fd < 0:
+      raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+  def add(self, path, mask):
+    """ Watch path, returns the watch descriptor """
+    if isinstance(path, unicode):
+      path = path.encode(sys.getfilesystemencoding() or "utf-8")
+    wd = self.addwatch(self.fd, path, mask)
+    if wd < 0:
+      raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+    return wd
+
+  def remove(self, wd):
+    """ Stop watching """
+    self.rmwatch(self.fd, wd)
+
+  def read(self):
+    """ Returns the pending events as (wd, mask, cookie, name) tuples """
+    events = []
+    try:
+      data = os.read(self.fd, 65536)
+    except OSError as e:
+      if e.errno == errno.EAGAIN:
+        return events
+      raise
+    offset = 0
+    while offset + EVENTHEADER.size <= len(data):
+      wd, mask, cookie, length = EVENTHEADER.unpack_from(data, offset)
+      offset += EVENTHEADER.size
+      name = data[offset:offset + length].rstrip("\0")
+      offset += length
+      events.append((wd, mask, cookie, name.decode("utf-8", "replace")))
+    return events
+
+  def close(self):
+    """ Release the inotify instance """
+    os.close(self.fd)
+
+
+class Watcher:
+  """ Watches ~/.autorandr, every profile directory in it and the
+  configuration file. Changes are collected for a short moment and then
+  passed to callback as a list of (kind, name) tuples, kind being one of the
+  change kinds of headless or CONF_CHANGED. A renamed profile is reported as
+  (PROFILE_RENAMED, oldname, newname). The callback is called from the
+  watcher thread.
+
+  inotify is used where possible. Profile directories which can not be
+  watched, for example because the inotify watch limit is reached, and
+  systems without inotify are polled every interval seconds. """
+
+  profilemask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | \
+      IN_DELETE | IN_ATTRIB
+  ardirmask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | \
+      IN_ONLYDIR | IN_DELETE_SELF
+  confmask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_CREATE
+
+  def __init__(self, ardir, arconf, callback, interval=5.0, delay=0.2, \
+      poll=False):
+    """ Nothing is watched until start() is called """
+    self.ardir = ardir
+    self.arconf = arconf
+    self.callback = callback
+    self.interval = interval
+    self.delay = delay
+    self.poll = poll
+    self.inotify = None
+    self.thread = None
+    self.wds = {}
+    self.polled = {}
+
+  def start(self):
+    """ Set up the watches and start the watcher thread """
+    if not self.poll:
+      try:
+        self.inotify = Inotify()
+      except (OSError, AttributeError) as e:
+        logging.info(u"inotify is not available, polling instead")
+    self.stoppipe = os.pipe()
+    if self.inotify:
+      self.__watchall()
+    else:
+      self.confstamp = self.__stamp(self.arconf)
+      self.ardirstamp = self.__stamp(self.ardir)
+      for name in self.__profiledirs():
+        self.polled[name] = self.__profilestamp(name)
+    self.thread = threading.Thread(target=self.__run, name="watcher")
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    """ Stop the watcher thread """
+    if self.thread is None:
+      return
+    os.write(self.stoppipe[1], "x")
+    self.thread.join()
+    self.thread = None
+    if self.inotify:
+      self.inotify.close()
+      self.inotify = None
+    os.close(self.stoppipe[0])
+    os.close(self.stoppipe[1])
+
+  def __stamp(self, path):
+    """ Returns (mtime, size) of path or None """
+    try:
+      st = os.stat(path)
+    except OSError as e:
+      return None
+    return (st.st_mtime, st.st_size)
+
+  def __profilestamp(self, name):
+    """ The stamps of a profile directory and of its config and comment """
+    profiledir = os.path.join(self.ardir, name)
+    return (self.__stamp(profiledir), \
+        self.__stamp(os.path.join(profiledir, "config")), \
+        self.__stamp(os.path.join(profiledir, "comment")))
+
+  def __profiledirs(self):
+    """ The names of all directories in ~/.autorandr """
+    try:
+      return [ i for i in os.listdir(self.ardir) \
+          if os.path.isdir(os.path.join(self.ardir, i)) ]
+    except OSError as e:
+      return []
+
+  def __watchall(self):
+    """ Watch ~/.autorandr, its profile directories and the directory of the
+    configuration file """
+    self.wds = {}
+    self.ardirwd = self.inotify.add(self.ardir, self.ardirmask)
+    self.confwd = self.inotify.add(os.path.dirname(self.arconf), \
+        self.confmask)
+    for name in self.__profiledirs():
+      self.__watchprofile(name)
+    logging.debug(u"Watching {0} profile directories, polling {1}".format(\
+        len(self.wds), len(self.polled)))
+
+  def __watchprofile(self, name):
+    """ Watch a profile directory or add it to the polled ones """
+    if self.polled:
+      # The limit was hit before, do not try again for every profile
+      self.polled[name] = self.__profilestamp(name)
+      return
+    try:
+      wd = self.inotify.add(os.path.join(self.ardir, name), self.profilemask)
+    except OSError as e:
+      if e.errno == errno.ENOSPC:
+        logging.warning(u"inotify watch limit reached, polling the " + \
+            u"remaining profiles")
+        self.polled[name] = self.__profilestamp(name)
+      return
+    self.wds[wd] = name
+
+  def __forgetprofile(self, name):
+    """ Stop watching a removed profile directory """
+    self.polled.pop(name, None)
+    for wd, wdname in self.wds.items():
+      if wdname == name:
+        del self.wds[wd]
+        self.inotify.remove(wd)
+
+  def __renameprofile(self, oldname, newname):
+    """ A watched profile directory was renamed, its watch stays """
+    if oldname in self.polled:
+      self.polled[newname] = self.polled.pop(oldname)
+    for wd, wdname in self.wds.items():
+      if wdname == oldname:
+        self.wds[wd] = newname
+
+  def __translate(self, events):
+    """ Turns inotify events into (kind, name) changes. A directory moved
+    out of and one moved into ~/.autorandr with the same cookie are a
+    rename. """
+    changes = set()
+    confname = os.path.basename(self.arconf)
+    movedto = dict((cookie, name) for wd, mask, cookie, name in events \
+        if wd == self.ardirwd and mask & IN_ISDIR and mask & IN_MOVED_TO)
+    renamed = set()
+    for wd, mask, cookie, name in events:
+      if mask & IN_Q_OVERFLOW:
+        logging.info(u"inotify queue overflow, rescanning")
+        for name in self.__profiledirs():
+          changes.add((headless.PROFILE_ADDED, name))
+        changes.add((CONF_CHANGED, None))
+      elif wd == self.ardirwd:
+        if not mask & IN_ISDIR:
+          continue
+        if mask & IN_MOVED_FROM and cookie in movedto:
+          self.__renameprofile(name, movedto[cookie])
+          renamed.add(cookie)
+          changes.add((headless.PROFILE_RENAMED, name, movedto[cookie]))
+        elif mask & IN_MOVED_TO and cookie in renamed:
+          continue
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+          self.__watchprofile(name)
+          changes.add((headless.PROFILE_ADDED, name))
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+          self.__forgetprofile(name)
+          changes.add((headless.PROFILE_DELETED, name))
+      elif wd == self.confwd:
+        if name == confname:
+          changes.add((CONF_CHANGED, None))
+      elif wd in self.wds and not mask & IN_IGNORED:
+        changes.add((headless.PROFILE_MODIFIED, self.wds[wd]))
+    return changes
+
+  def __pollchanges(self):
+    """ Compare the stamps of the polled files with the recorded ones """
+    changes = set()
+    if not self.inotify:
+      stamp = self.__stamp(self.arconf)
+      if stamp != self.confstamp:
+        self.confstamp = stamp
+        changes.add((CONF_CHANGED, None))
+      stamp = self.__stamp(self.ardir)
+      if stamp != self.ardirstamp:
+        self.ardirstamp = stamp
+        names = set(self.__profiledirs())
+        for name in names.difference(self.polled):
+          self.polled[name] = self.__profilestamp(name)
+          changes.add((headless.PROFILE_ADDED, name))
+        for name in set(self.polled).difference(names):
+          del self.polled[name]
+          changes.add((headless.PROFILE_DELETED, name))
+    for name, stamp in self.polled.items():
+      current = self.__profilestamp(name)
+      if current != stamp:
+        self.polled[name] = current
+        changes.add((headless.PROFILE_MODIFIED, name))
+    return changes
+
+  def __run(self):
+    """ The watcher thread """
+    fds = [self.stoppipe[0]]
+    if self.inotify:
+      fds.append(self.inotify.fd)
+    changes = set()
+    lastpoll = time.time()
+    while True:
+      if changes:
+        timeout = self.delay
+      elif self.polled or not self.inotify:
+        timeout = max(0, lastpoll + self.interval - time.time())
+      else:
+        timeout = None
+      ready = select.select(fds, [], [], timeout)[0]
+      if self.stoppipe[0] in ready:
+        return
+      if ready:
+        changes.update(self.__translate(self.inotify.read()))
+        # Wait for more events before reporting
+        continue
+      if (self.polled or not self.inotify) and \
+          time.time() >= lastpoll + self.interval:
+        lastpoll = time.time()
+        changes.update(self.__pollchanges())
+        if changes:
+          continue
+      if changes:
+        logging.debug(u"Changes: {0}".format(repr(changes)))
+        try:
+          self.callback(sorted(changes))
+        except Exception as e:
+          logging.exception(u"Handling changes failed")
+        changes = set()
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import threading, logging
+import runner
+
+class Operation:
+  """ A function to run on a worker thread and what to do with its result """
+
+  def __init__(self, key, kind, name, func, args, callback, coalesce):
+    """ See Worker.submit """
+    self.key = key
+    self.kind = kind
+    self.name = name
+    self.func = func
+    self.args = args
+    self.callback = callback
+    self.coalesce = coalesce
+
+  def describe(self):
+    """ (kind, name) for progress reports """
+    return (self.kind, self.name)
+
+
+class Worker:
+  """ Runs backend operations on a pool of threads. Operations with the same
+  key (the display they change) run one after another in the order they were
+  submitted. A queued operation submitted with coalesce=True is replaced by a
+  newer one of the same key and kind, so only the last of several quick
+  requests runs.
+
+  Results and progress are handed to dispatch, which is expected to call them
+  on the thread of the caller, e.g. wx.CallAfter. """
+
+  def __init__(self, dispatch, progress=None, threads=2):
+    """ Start the worker threads. progress is called with a list of the
+    (kind, name) of all queued and running operations whenever it changes. """
+    self.dispatch = dispatch
+    self.progress = progress
+    self.lock = threading.Condition()
+    self.pending = []
+    self.running = []
+    self.stopped = False
+    self.threads = []
+    for i in range(threads):
+      thread = threading.Thread(target=self.__run, name="worker-{0}".format(i))
+      thread.daemon = True
+      thread.start()
+      self.threads.append(thread)
+
+  def submit(self, key, kind, name, func, args=(), callback=None, \
+      coalesce=False):
+    """ Queue func(*args). callback is dispatched with its result. """
+    op = Operation(key, kind, name, func, args, callback, coalesce)
+    with self.lock:
+      if coalesce:
+        for i, queued in enumerate(self.pending):
+          if queued.coalesce and queued.key == key and queued.kind == kind:
+            logging.debug(u"{0} {1} replaces {2}".format(kind, name, \
+                queued.name))
+            self.pending[i] = op
+            break
+        else:
+          self.pending.append(op)
+      else:
+        self.pending.append(op)
+      self.lock.notify_all()
+    self.__report()
+    return op
+
+  def busy(self):
+    """ Returns the (kind, name) of all queued and running operations """
+    with self.lock:
+      return [ op.describe() for op in self.running + self.pending ]
+
+  def stop(self):
+    """ Let the threads end after their current operation """
+    with self.lock:
+      self.stopped = True
+      self.lock.notify_all()
+
+  def __report(self):
+    """ Dispatch a progress report """
+    if self.progress:
+      self.dispatch(self.progress, self.busy())
+
+  def __take(self):
+    """ Wait for an operation whose key is not in use """
+    with self.lock:
+      while not self.stopped:
+        keys = [ op.key for op in self.running ]
+        for op in self.pending:
+          if op.key not in keys:
+            self.pending.remove(op)
+            self.running.append(op)
+            return op
+          # Keep the order of operations with the same key
+          keys.append(op.key)
+        self.lock.wait()
+    return None
+
+  def __run(self):
+    """ A worker thread """
+    while True:
+      op = self.__take()
+      if op is None:
+        return
+      self.__report()
+      logging.debug(u"Running {0} {1}".format(op.kind, op.name))
+      try:
+        with runner.transaction(op.kind):
+          result = op.func(*op.args)
+      except Exception as e:
+        logging.exception(u"{0} {1} failed".format(op.kind, op.name))
+        result = None
+      with self.lock:
+        self.running.remove(op)
+        self.lock.notify_all()
+      if op.callback:
+        self.dispatch(op.callback, result)
+      self.__report()
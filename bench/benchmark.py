@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+""" Measures autorandr-gui without an X server. Fake autorandr, auto-disper,
+disper, xrandr, xdpyinfo, lspci and which scripts are put in front of PATH,
+~/.autorandr is filled with synthetic profiles and a fake sysfs tree stands in
+for the monitors and the graphics card. Every flow runs in a new interpreter,
+once with empty caches (cold) and once more (warm).
+
+  bench/benchmark.py --profiles 10,100,1000 --format both --delay 0.05 """
+
+import os, sys, json, time, shutil, tempfile, hashlib, subprocess, logging
+from optparse import OptionParser, SUPPRESS_HELP
+
+""" The directory of the autorandrgui modules """
+PACKAGEDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui")
+
+""" The fake executables """
+TOOLS = ["autorandr", "auto-disper", "disper", "xrandr", "xdpyinfo", "lspci", \
+    "which"]
+
+""" The measured flows, in the order they are run """
+FLOWS = ["startup", "getprofiles", "refresh", "hotkey", "boot"]
+
+""" The monitors connected in the fake sysfs tree """
+CONNECTED = [("LVDS-1", "LVDS1"), ("HDMI-A-1", "HDMI1")]
+
+""" The monitors profiles may be made for """
+MONITORS = ["LVDS1", "HDMI1", "VGA1", "DP1", "DP2"]
+
+""" xrandr -q of the fake X server """
+XRANDR = """Screen 0: minimum 320 x 200, current 3286 x 1080, maximum 8192 x 8192
+LVDS1 connected primary 1366x768+0+0 (normal left inverted right x axis y axis) 309mm x 174mm
+   1366x768      60.0*+   40.0
+   1024x768      60.0
+HDMI1 connected 1920x1080+1366+0 (normal left inverted right x axis y axis) 510mm x 290mm
+   1920x1080     60.0*+   50.0
+VGA1 disconnected (normal left inverted right x axis y axis)
+DP1 disconnected (normal left inverted right x axis y axis)
+DP2 disconnected (normal left inverted right x axis y axis)
+"""
+
+""" Lines of the output of lspci -m """
+LSPCI = """00:00.0 "Host bridge" "Intel Corporation" "Host Bridge"
+00:02.0 "VGA compatible controller" "Intel Corporation" "HD Graphics"
+00:1f.3 "Audio device" "Intel Corporation" "HD Audio"
+"""
+
+""" The output of xdpyinfo, NV-CONTROL is appended for auto-disper """
+XDPYINFO = """name of display:    :0
+version number:    11.0
+number of extensions:    4
+    Composite
+    DPMS
+    RANDR
+    XINERAMA
+"""
+
+def main():
+  """ Parse the options and run the benchmark or, with --child, one flow """
+  opts = OptionParser(usage="%prog [options]")
+  opts.add_option("--profiles", dest="profiles", default="10,100,1000", \
+      help="Comma separated numbers of profiles [%default].")
+  opts.add_option("--format", dest="format", default="both", \
+      help="xrandr, disper or both [%default].")
+  opts.add_option("--delay", dest="delay", type="float", default=0.02, \
+      help="Seconds every fake tool takes [%default].")
+  opts.add_option("--tool-delay", dest="tooldelay", action="append", \
+      default=[], metavar="TOOL=SECONDS", help="Delay of a single tool.")
+  opts.add_option("--tool-output", dest="tooloutput", action="append", \
+      default=[], metavar="TOOL=FILE", \
+      help="Print the contents of FILE instead of the built-in output.")
+  opts.add_option("--runs", dest="runs", type="int", default=3, \
+      help="Warm runs per flow, the median is reported [%default].")
+  opts.add_option("--json", dest="json", metavar="FILE", \
+      help="Also write the results to FILE.")
+  opts.add_option("--keep", dest="keep", action="store_true", \
+      help="Keep the generated trees.")
+  opts.add_option("--child", dest="child", help=SUPPRESS_HELP)
+  opts.add_option("--sysfs", dest="sysfs", help=SUPPRESS_HELP)
+  (options, args) = opts.parse_args()
+  if options.child:
+    child(options.child, options.sysfs)
+    return
+  logging.basicConfig(level=logging.INFO)
+  if options.format == "both":
+    formats = ["xrandr", "disper"]
+  else:
+    formats = [options.format]
+  delays = parseassignments(options.tooldelay, float)
+  outputs = parseassignments(options.tooloutput, readfile)
+  results = []
+  print("{0:<7} {1:>8} {2:<12} {3:<5} {4:>10} {5:>10} {6:>6}  {7}".format(\
+      "format", "profiles", "flow", "cache", "wall ms", "flow ms", "procs", \
+      "tools"))
+  for fmt in formats:
+    for count in [ int(i) for i in options.profiles.split(",") ]:
+      bench = Bench(fmt, count, options.delay, delays, outputs)
+      try:
+        for result in bench.run(options.runs):
+          results.append(result)
+          report(result)
+      finally:
+        if options.keep:
+          logging.info(u"Kept {0}".format(bench.root))
+        else:
+          bench.remove()
+  if options.json:
+    with open(options.json, "w") as fp:
+      json.dump(results, fp, indent=1)
+
+def parseassignments(assignments, convert):
+  """ Turns a list of "TOOL=VALUE" into a dict """
+  values = {}
+  for assignment in assignments:
+    tool, value = assignment.split("=", 1)
+    if tool not in TOOLS:
+      sys.exit("Unknown tool {0}".format(tool))
+    values[tool] = convert(value)
+  return values
+
+def readfile(filename):
+  """ Returns the contents of a file """
+  with open(filename) as fp:
+    return fp.read()
+
+def report(result):
+  """ Print one line of results """
+  tools = " ".join("{0}={1}".format(k, v) for k, v in \
+      sorted(result['tools'].items()))
+  print("{0:<7} {1:>8} {2:<12} {3:<5} {4:>10.1f} {5:>10.1f} {6:>6}  {7}".format(\
+      result['format'], result['profiles'], result['flow'], \
+      result['cache'], result['wall'] * 1000, result['seconds'] * 1000, \
+      result['procs'], tools))
+
+def median(values):
+  """ The median of a non-empty list """
+  values = sorted(values)
+  return values[len(values) // 2]
+
+def edid(name):
+  """ A fake EDID of 128 bytes for a monitor """
+  block = ""
+  while len(block) < 128:
+    block += hashlib.md5(name + str(len(block))).digest()
+  return "\x00\xff\xff\xff\xff\xff\xff\x00" + block[8:128]
+
+def child(flow, sysfsroot):
+  """ Run a single flow in this interpreter and print how long it took """
+  sys.path.insert(0, PACKAGEDIR)
+  logging.basicConfig(level=logging.CRITICAL)
+  started = time.time()
+  if flow == "boot":
+    import launcher
+    launcher.boot(started, sysfsroot)
+    result = None
+  else:
+    import headless
+    ctrl = headless.Headless(sysfsroot)
+    result = None
+    if flow == "getprofiles":
+      result = len(ctrl.GetProfiles())
+    elif flow == "refresh":
+      # What ListProfilesGUI gathers for every row, without wx: the details
+      # of the profiles of this card, the summary of the others
+      import profileconfig
+      detected = ctrl.GetDetectedProfiles()
+      names = ctrl.GetProfiles(False)
+      if ctrl.HideIncompatible():
+        names = [ i for i in names if ctrl.IsCompatible(i) ]
+      ctrl.GetAllProfileInfo()
+      rows = 0
+      compatible = 0
+      for name in names:
+        if ctrl.IsCompatible(name):
+          info = ctrl.GetProfileInfo(name, detected)
+          if info is not None:
+            compatible += 1
+        else:
+          info = ctrl.GetSummary(name)
+        if info is not None:
+          rows += 1
+      result = { 'rows': rows, 'compatible': compatible, \
+          'configs': len(profileconfig.parsecache) }
+    elif flow == "hotkey":
+      # Controller.HandleHotkey up to the TimeoutDialog, in its transaction
+      import runner
+      with runner.transaction("hotkey"):
+        ctrl.MonitorsChanged()
+        ctrl.autorandr.snapshot()
+        result = ctrl.ApplyDetected()
+        if result is None:
+          ctrl.autorandr.fallback()
+          ctrl.autorandr.setactiveprofile(None)
+  json.dump({ 'seconds': time.time() - started, 'result': result }, \
+      sys.stdout)
+
+
+class Bench:
+  """ A generated home directory, fake sysfs tree and fake tools for one
+  profile format and number of profiles """
+
+  def __init__(self, fmt, count, delay, delays={}, outputs={}):
+    """ Generate everything in a new temporary directory """
+    self.format = fmt
+    self.count = count
+    self.root = tempfile.mkdtemp(prefix="autorandr-gui-bench-")
+    self.home = os.path.join(self.root, "home")
+    self.ardir = os.path.join(self.home, ".autorandr")
+    self.bindir = os.path.join(self.root, "bin")
+    self.sysfs = os.path.join(self.root, "sys")
+    self.runtimedir = os.path.join(self.root, "run")
+    self.calls = os.path.join(self.root, "calls.log")
+    self.gpuhash = self.lspcihash()
+    for directory in [self.ardir, self.bindir, self.runtimedir]:
+      os.makedirs(directory)
+    self.makesysfs()
+    self.makeprofiles()
+    self.maketools(delay, delays, outputs)
+
+  def lspcihash(self):
+    """ The gpuhash the application computes for the fake graphics card,
+    see AutoRandR.__lspcihash """
+    lspci = ""
+    for line in LSPCI.splitlines():
+      if '"VGA compatible controller"' in line:
+        lspci = lspci + line.strip() + os.linesep
+    if self.format == "disper":
+      # auto-disper is used because of NV-CONTROL
+      lspci = lspci + 'nvidia'
+    return hashlib.md5(lspci).hexdigest()
+
+  def remove(self):
+    """ Delete the generated files """
+    shutil.rmtree(self.root, True)
+
+  def write(self, filename, content, mode=None):
+    """ Write a file, creating its directory """
+    if not os.path.isdir(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    with open(filename, "w") as fp:
+      fp.write(content)
+    if mode is not None:
+      os.chmod(filename, mode)
+
+  def makesysfs(self):
+    """ A graphics card with two connected and one empty connector """
+    drm = os.path.join(self.sysfs, "class", "drm")
+    for connector, output in CONNECTED:
+      self.write(os.path.join(drm, "card0-" + connector, "status"), \
+          "connected\n")
+      self.write(os.path.join(drm, "card0-" + connector, "edid"), \
+          edid(output))
+    self.write(os.path.join(drm, "card0-DP-1", "status"), "disconnected\n")
+    self.write(os.path.join(drm, "card0-DP-1", "edid"), "")
+    device = os.path.join(self.sysfs, "bus", "pci", "devices", "0000:00:02.0")
+    self.write(os.path.join(device, "class"), "0x030000\n")
+    self.write(os.path.join(device, "vendor"), "0x8086\n")
+    self.write(os.path.join(device, "device"), "0x0166\n")
+    self.write(os.path.join(device, "revision"), "0x09\n")
+    self.write(os.path.join(device, "subsystem_vendor"), "0x17aa\n")
+    self.write(os.path.join(device, "subsystem_device"), "0x21fa\n")
+    driver = os.path.join(self.sysfs, "bus", "pci", "drivers", "i915")
+    os.makedirs(driver)
+    os.symlink(driver, os.path.join(device, "driver"))
+
+  def profileoutputs(self, number):
+    """ The monitors of the synthetic profile number. Every tenth profile is
+    made for the connected monitors. """
+    if number % 10 == 0:
+      return [ output for connector, output in CONNECTED ]
+    first = MONITORS[number % len(MONITORS)]
+    second = MONITORS[(number // len(MONITORS)) % len(MONITORS)]
+    if first == second:
+      return [first]
+    return [first, second]
+
+  def config(self, outputs):
+    """ The config file of a profile using outputs """
+    if self.format == "disper":
+      displays = []
+      x = 0
+      for output in outputs:
+        displays.append("{0}: 1920x1080 @1920x1080 +{1}+0".format(output, x))
+        x += 1920
+      return "backend: nvidia\nassociated displays: {0}\nmetamode: {1}\n" \
+          "scaling: default, default\n".format(", ".join(outputs), \
+          ", ".join(displays))
+    lines = []
+    x = 0
+    for output in MONITORS:
+      lines.append("output {0}".format(output))
+      if output in outputs:
+        lines += ["mode 1920x1080", "pos {0}x0".format(x), "rate 60.0"]
+        if output == outputs[0]:
+          lines.append("primary")
+        x += 1920
+      else:
+        lines.append("off")
+    return "\n".join(lines) + "\n"
+
+  def setup(self, outputs):
+    """ The setup file autorandr fingerprints a profile with """
+    return "".join("{0} {1}\n".format(output, edid(output).encode("hex")) \
+        for output in outputs)
+
+  def makeprofile(self, name, outputs, comment=None, gpuhash=None):
+    """ Write one profile """
+    profiledir = os.path.join(self.ardir, name)
+    self.write(os.path.join(profiledir, "config"), self.config(outputs))
+    if self.format == "xrandr":
+      self.write(os.path.join(profiledir, "setup"), self.setup(outputs))
+    if comment:
+      self.write(os.path.join(profiledir, "comment"), comment + "\n")
+    if gpuhash:
+      self.write(os.path.join(profiledir, "gpuhash"), gpuhash + "\n")
+
+  def makeprofiles(self):
+    """ Fill ~/.autorandr, some profiles belong to another graphics card """
+    self.detected = []
+    for number in range(self.count):
+      name = "profile-{0:05d}".format(number)
+      outputs = self.profileoutputs(number)
+      if number % 10 == 0:
+        self.detected.append(name)
+      gpuhash = self.gpuhash
+      if number % 7 == 3:
+        gpuhash = hashlib.md5("another card").hexdigest()
+      comment = None
+      if number % 3 == 0:
+        comment = "Synthetic profile {0} with {1}".format(number, \
+            " and ".join(outputs))
+      self.makeprofile(name, outputs, comment, gpuhash)
+    self.write(os.path.join(self.ardir, "gui.ini"), "[Helpers]\n" \
+        "guiconf_nvidia = nvidia-settings\nguiconf = kcmshell4 display\n")
+    self.write(self.ardir + ".conf", "DEFAULT_PROFILE=profile-00000\n")
+
+  def tooloutput(self, tool):
+    """ The built-in output of a fake tool """
+    if tool == "xrandr":
+      return XRANDR
+    if tool == "lspci":
+      return LSPCI
+    if tool == "xdpyinfo":
+      if self.format == "disper":
+        return XDPYINFO.replace("number of extensions:    4", \
+            "number of extensions:    5") + "    NV-CONTROL\n"
+      return XDPYINFO
+    if tool in ("autorandr", "auto-disper"):
+      # The listing autorandr and auto-disper print without arguments
+      return "".join("{0}{1}\n".format(name, \
+          " (detected)" if name in self.detected else "") \
+          for name in sorted(os.listdir(self.ardir)) \
+          if os.path.isdir(os.path.join(self.ardir, name)))
+    return ""
+
+  def maketools(self, delay, delays, outputs):
+    """ Write the fake tools, they log every call to self.calls """
+    template = """#!/bin/sh
+echo "{name} $*" >> {calls}
+sleep {delay}
+if [ "$1" = "-s" ] && [ -n "$2" ]; then
+  mkdir -p "$HOME/.autorandr/$2"
+  cp {template}/* "$HOME/.autorandr/$2/"
+  exit 0
+fi
+if [ "$1" = "-l" ]; then
+  exit 0
+fi
+cat {output} 2>/dev/null
+"""
+    template_profile = os.path.join(self.root, "template")
+    outputs_now = [ output for connector, output in CONNECTED ]
+    self.write(os.path.join(template_profile, "config"), \
+        self.config(outputs_now))
+    if self.format == "xrandr":
+      self.write(os.path.join(template_profile, "setup"), \
+          self.setup(outputs_now))
+    for tool in TOOLS:
+      output = os.path.join(self.root, "output", tool)
+      self.write(output, outputs.get(tool, self.tooloutput(tool)))
+      self.write(os.path.join(self.bindir, tool), template.format(\
+          name=tool, calls=self.calls, delay=delays.get(tool, delay), \
+          template=template_profile, output=output), 0755)
+
+  def environment(self):
+    """ The environment of the measured interpreter """
+    env = dict(os.environ)
+    env['HOME'] = self.home
+    env['PATH'] = self.bindir + os.pathsep + env.get('PATH', os.defpath)
+    env['XDG_RUNTIME_DIR'] = self.runtimedir
+    env['DISPLAY'] = ":0"
+    return env
+
+  def clearcaches(self):
+    """ Forget everything the application stored between runs """
+    for filename in [self.ardir + ".index", self.ardir + ".gpumap"]:
+      if os.path.exists(filename):
+        os.remove(filename)
+    shutil.rmtree(self.runtimedir, True)
+    os.makedirs(self.runtimedir)
+
+  def calllog(self):
+    """ Returns and empties the lines of the call log """
+    try:
+      with open(self.calls) as fp:
+        lines = fp.read().splitlines()
+    except IOError as e:
+      return []
+    os.remove(self.calls)
+    return lines
+
+  def measure(self, flow):
+    """ Run a flow in a new interpreter, returns a result dict """
+    self.calllog()
+    started = time.time()
+    exe = subprocess.Popen([sys.executable, os.path.abspath(__file__), \
+        "--child", flow, "--sysfs", self.sysfs], stdout=subprocess.PIPE, \
+        env=self.environment())
+    out = exe.communicate()[0]
+    wall = time.time() - started
+    if exe.returncode != 0:
+      raise RuntimeError("{0} failed with {1}".format(flow, exe.returncode))
+    child = json.loads(out.splitlines()[-1])
+    tools = {}
+    for line in self.calllog():
+      tool = line.split()[0]
+      tools[tool] = tools.get(tool, 0) + 1
+    return { 'format': self.format, 'profiles': self.count, 'flow': flow, \
+        'wall': wall, 'seconds': child['seconds'], \
+        'result': child['result'], 'procs': sum(tools.values()), \
+        'tools': tools }
+
+  def check(self, result):
+    """ Raises RuntimeError if a flow did not do what it is measured for """
+    if result['flow'] == "refresh":
+      if not result['result']['compatible']:
+        raise RuntimeError("refresh showed no compatible profiles")
+      if result['result']['configs'] > result['result']['compatible']:
+        raise RuntimeError("refresh read the configs of other cards")
+    if result['flow'] == "hotkey" and result['result'] is None:
+      raise RuntimeError("hotkey loaded no detected profile")
+
+  def run(self, runs):
+    """ Measure every flow cold and warm """
+    for flow in FLOWS:
+      self.clearcaches()
+      result = self.measure(flow)
+      result['cache'] = "cold"
+      self.check(result)
+      yield result
+      warm = [ self.measure(flow) for i in range(max(1, runs)) ]
+      for i in warm:
+        self.check(i)
+      result = dict(warm[0])
+      result['wall'] = median([ i['wall'] for i in warm ])
+      result['seconds'] = median([ i['seconds'] for i in warm ])
+      result['cache'] = "warm"
+      yield result
+
+""" Load main() """
+if __name__ == "__main__":
+  main()
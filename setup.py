@@ -25,7 +25,7 @@ setup (name = 'autorandr-gui',
   author_email = 'externer.dl.vogetseder@muenchen.de',
   url = 'http://www.muenchen.de/limux',
   packages = ['autorandrgui'],
-  scripts = ['autorandr-gui'],
+  scripts = ['autorandr-gui', 'autorandr-gui-cli', 'autorandr-gui-sysindex'],
   data_files =
   [('/etc/xdg/autostart',['data/autorandr-gui.desktop']),('/usr/share/kde4/apps/khotkeys',['data/autorandr-gui.khotkeys'])],
 )
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil, tarfile, io
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import archive
+
+class ArchiveTest(unittest.TestCase):
+  """ Exporting profiles and importing them into another directory """
+
+  def setUp(self):
+    """ Two profiles to export, one with a hook, and an empty target """
+    self.tmpdir = tempfile.mkdtemp()
+    self.source = os.path.join(self.tmpdir, "source")
+    self.target = os.path.join(self.tmpdir, "target")
+    os.mkdir(self.target)
+    self.write(self.source, "dock", "config", "output HDMI1\n")
+    self.write(self.source, "dock", "comment", "Docking station\n")
+    self.write(self.source, "dock", "postswitch", "#!/bin/sh\n", 0755)
+    self.write(self.source, "laptop", "config", "output LVDS1\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, ardir, name, filename, content, mode=0644):
+    """ Writes a file of a profile """
+    directory = os.path.join(ardir, name)
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    with open(os.path.join(directory, filename), "w") as fp:
+      fp.write(content)
+    os.chmod(os.path.join(directory, filename), mode)
+
+  def read(self, name, filename):
+    with open(os.path.join(self.target, name, filename)) as fp:
+      return fp.read()
+
+  def export(self):
+    """ A stream with both profiles, dock as default """
+    fp = io.BytesIO()
+    self.assertEqual(archive.export(self.source, ["dock", "laptop"], fp, \
+        "dock"), ["dock", "laptop"])
+    fp.seek(0)
+    return fp
+
+  def load(self, existing=(), policy=archive.SKIP, hooks=False):
+    """ Imports the export into the target """
+    importer = archive.Importer(self.target, existing, policy, hooks)
+    importer.read(self.export())
+    result = importer.finish()
+    self.assertEqual([ i for i in os.listdir(self.target) \
+        if i.startswith(archive.STAGING) ], [])
+    return importer, result
+
+  def test_import(self):
+    importer, result = self.load()
+    self.assertEqual(result, (["dock", "laptop"], []))
+    self.assertEqual(importer.default, "dock")
+    self.assertEqual(self.read("dock", "comment"), "Docking station\n")
+
+  def test_no_hooks(self):
+    self.load()
+    self.assertEqual(sorted(os.listdir(os.path.join(self.target, "dock"))), \
+        ["comment", "config"])
+
+  def test_hooks(self):
+    self.load(hooks=True)
+    postswitch = os.path.join(self.target, "dock", "postswitch")
+    self.assertEqual(os.stat(postswitch).st_mode & 0777, 0755)
+
+  def test_skip(self):
+    self.write(self.target, "dock", "config", "output VGA1\n")
+    importer, result = self.load(["dock"])
+    self.assertEqual(result, (["laptop"], []))
+    self.assertEqual(importer.skipped, ["dock"])
+    self.assertEqual(self.read("dock", "config"), "output VGA1\n")
+
+  def test_overwrite(self):
+    self.write(self.target, "dock", "config", "output VGA1\n")
+    self.write(self.target, "dock", "setup", "VGA1 00ff\n")
+    importer, result = self.load(["dock"], archive.OVERWRITE)
+    self.assertEqual(result, (["dock", "laptop"], ["dock"]))
+    self.assertEqual(self.read("dock", "config"), "output HDMI1\n")
+    self.assertFalse(os.path.exists(os.path.join(self.target, "dock", \
+        "setup")))
+
+  def test_rename(self):
+    self.write(self.target, "dock", "config", "output VGA1\n")
+    importer, result = self.load(["dock", "dock-2"], archive.RENAME)
+    self.assertEqual(importer.renamed, { "dock": "dock-3" })
+    self.assertEqual(self.read("dock-3", "config"), "output HDMI1\n")
+    self.assertEqual(self.read("dock", "config"), "output VGA1\n")
+
+  def test_bad_members(self):
+    fp = io.BytesIO()
+    tar = tarfile.open(fileobj=fp, mode="w|")
+    for name in ["../evil/config", "dock/sub/config", "/abs/config"]:
+      info = tarfile.TarInfo(name)
+      info.size = 1
+      tar.addfile(info, io.BytesIO("x"))
+    tar.close()
+    fp.seek(0)
+    importer = archive.Importer(self.target, [])
+    importer.read(fp)
+    self.assertEqual(importer.finish(), ([], []))
+    self.assertEqual(os.listdir(self.target), [])
+    self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "evil")))
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()
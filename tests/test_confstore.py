@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import confstore
+
+class ConfStoreTest(unittest.TestCase):
+  """ Reading and rewriting ~/.autorandr.conf """
+
+  def setUp(self):
+    """ A configuration with a comment and a duplicate """
+    self.tmpdir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.tmpdir, "autorandr.conf")
+    with open(self.filename, "w") as fp:
+      fp.write('# comment\nDEFAULT_PROFILE="dock"\nactive_profile="home"\n' \
+          'DEFAULT_PROFILE="ignored"\n')
+    os.chmod(self.filename, 0600)
+    self.store = confstore.ConfStore(self.filename)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def read(self):
+    with open(self.filename) as fp:
+      return fp.read()
+
+  def test_get(self):
+    self.assertEqual(self.store.get("default_profile"), "dock")
+    self.assertEqual(self.store.get("ACTIVE_PROFILE"), "home")
+    self.assertEqual(self.store.get("missing"), None)
+
+  def test_update(self):
+    self.assertTrue(self.store.update({ "default_profile": u"büro", \
+        "ACTIVE_PROFILE": None, "NEW": u"x" }))
+    self.assertEqual(self.read(), '# comment\nDEFAULT_PROFILE="b\xc3\xbcro"\n' \
+        'ACTIVE_PROFILE=""\nNEW="x"\n')
+    self.assertEqual(os.stat(self.filename).st_mode & 0777, 0600)
+    self.assertEqual(confstore.ConfStore(self.filename).get("new"), "x")
+    self.assertEqual(os.listdir(self.tmpdir), ["autorandr.conf"])
+
+  def test_external_change(self):
+    self.assertEqual(self.store.get("default_profile"), "dock")
+    with open(self.filename, "w") as fp:
+      fp.write('DEFAULT_PROFILE="laptop"\n')
+    self.assertEqual(self.store.get("default_profile"), "laptop")
+
+  def test_missing_file(self):
+    os.unlink(self.filename)
+    self.assertEqual(self.store.getall(), {})
+    self.assertTrue(self.store.set("default_profile", u"dock"))
+    self.assertEqual(self.read(), 'DEFAULT_PROFILE="dock"\n')
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import detect
+
+class ConnectorNameTest(unittest.TestCase):
+  """ DRM connector and xrandr output names """
+
+  def test_names(self):
+    for name in ["card0-HDMI-A-1", "HDMI1", "HDMI-1", "HDMI-A-1"]:
+      self.assertEqual(detect.connectorname(name), "hdmi1")
+    self.assertEqual(detect.connectorname("card1-DP-2"), "dp2")
+    self.assertEqual(detect.connectorname("card0-DisplayPort-1"), "dp1")
+    self.assertEqual(detect.connectorname("card0-DVI-D-1"), "dvi1")
+    self.assertEqual(detect.connectorname("eDP1"), "edp1")
+    self.assertEqual(detect.connectorname("DVI-0"), "dvi0")
+
+
+class DrmDetectorTest(unittest.TestCase):
+  """ Detection on a fake sysfs tree with a panel and a monitor """
+
+  def setUp(self):
+    """ The sysfs tree and a profile directory """
+    self.tmpdir = tempfile.mkdtemp()
+    self.ardir = os.path.join(self.tmpdir, "autorandr")
+    os.mkdir(self.ardir)
+    for connector, status, edid in [("LVDS-1", "connected", "\x01\x02"), \
+        ("HDMI-A-1", "connected", "\x00\xff"), ("DP-1", "disconnected", "")]:
+      directory = os.path.join(self.tmpdir, "class", "drm", "card0-" + \
+          connector)
+      os.makedirs(directory)
+      self.write(os.path.join(directory, "status"), status + "\n")
+      self.write(os.path.join(directory, "edid"), edid)
+    self.detector = detect.DrmDetector(self.ardir, self.tmpdir)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, filename, content):
+    with open(filename, "wb") as fp:
+      fp.write(content)
+
+  def profile(self, name, setup):
+    """ Saves a profile with a setup file """
+    os.mkdir(os.path.join(self.ardir, name))
+    self.write(os.path.join(self.ardir, name, "setup"), setup)
+    return name
+
+  def test_fingerprint(self):
+    self.assertTrue(self.detector.available())
+    self.assertEqual(self.detector.fingerprint(), \
+        (u"hdmi1 00ff", u"lvds1 0102"))
+
+  def test_detect(self):
+    names = [ self.profile(u"dock", "LVDS1 0102\nHDMI1 00ff\n"), \
+        self.profile(u"Beamer", "LVDS1 0102\nHDMI1 00ff\n"), \
+        self.profile(u"swapped", "LVDS1 00ff\nHDMI1 0102\n"), \
+        self.profile(u"laptop", "LVDS1 0102\n"), \
+        self.profile(u".boot", "LVDS1 0102\nHDMI1 00ff\n") ]
+    self.assertEqual(self.detector.detect(names), [u"Beamer", u"dock"])
+
+  def test_other_machine(self):
+    names = [ self.profile(u"dock", "LVDS1 0102\nHDMI1 00ff\n"), \
+        self.profile(u"vga", "LVDS1 0102\nVGA1 0304\n") ]
+    self.assertEqual(self.detector.detect(names), [u"dock"])
+
+  def test_unmapped(self):
+    names = [ self.profile(u"dock", "LVDS1 0102\nHDMI1 00ff\n"), \
+        self.profile(u"radeon", "LVDS 0102\nDVI-0 00ff\n") ]
+    self.assertEqual(self.detector.detect(names), None)
+    self.assertEqual(self.detector.unmapped, [u"radeon"])
+
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import planner
+
+""" xrandr -q of a laptop with a monitor right of its panel """
+XRANDR = """Screen 0: minimum 320 x 200, current 3286 x 1080, maximum 8192 x 8192
+LVDS1 connected primary 1366x768+0+0 (normal left inverted right x axis y axis) 309mm x 174mm
+   1366x768      60.0*+   40.0
+   1024x768      60.0
+HDMI1 connected 1920x1080+1366+0 (normal left inverted right x axis y axis) 510mm x 290mm
+   1920x1080     60.0*+   50.0
+   1280x1024     60.0
+VGA1 disconnected (normal left inverted right x axis y axis)
+"""
+
+""" The config autorandr saves for that state """
+CONFIG = """output LVDS1
+mode 1366x768
+pos 0x0
+rate 60.0
+primary
+output HDMI1
+mode 1920x1080
+pos 1366x0
+rate 60.0
+output VGA1
+off
+"""
+
+class PlannerTest(unittest.TestCase):
+  """ The xrandr commands planned for canned states and configs """
+
+  def setUp(self):
+    """ A directory for the config files """
+    self.tmpdir = tempfile.mkdtemp()
+    self.count = 0
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def config(self, content):
+    """ Writes a config file and returns what parseconfig makes of it """
+    self.count += 1
+    filename = os.path.join(self.tmpdir, "config{0}".format(self.count))
+    with open(filename, "w") as fp:
+      fp.write(content)
+    return planner.parseconfig(filename)
+
+  def plan(self, config, xrandr=XRANDR):
+    """ The command loading config in the state xrandr """
+    return planner.plan(planner.parsestate(xrandr), self.config(config))
+
+  def test_parsestate(self):
+    state = planner.parsestate(XRANDR)
+    self.assertEqual(sorted(state), ["HDMI1", "LVDS1", "VGA1"])
+    self.assertEqual(state["LVDS1"]['mode'], "1366x768")
+    self.assertEqual(state["LVDS1"]['rate'], "60.0")
+    self.assertTrue(state["LVDS1"]['primary'])
+    self.assertEqual(state["HDMI1"]['pos'], "1366x0")
+    self.assertFalse(state["HDMI1"]['primary'])
+    self.assertTrue(state["VGA1"]['off'])
+    self.assertFalse(state["VGA1"]['connected'])
+    self.assertTrue(planner.complete(state))
+
+  def test_noop(self):
+    self.assertEqual(self.plan(CONFIG), [])
+
+  def test_rate_rounding(self):
+    self.assertEqual(self.plan(CONFIG.replace("rate 60.0", "rate 60.02")), [])
+
+  def test_switch_off(self):
+    config = CONFIG.replace("output HDMI1\nmode 1920x1080\npos 1366x0\n" \
+        "rate 60.0\n", "output HDMI1\noff\n")
+    self.assertEqual(self.plan(config), \
+        ["xrandr", "--output", "HDMI1", "--off"])
+
+  def test_switch_on(self):
+    config = CONFIG.replace("output VGA1\noff\n", \
+        "output VGA1\nmode 1024x768\npos 3286x0\n")
+    self.assertEqual(self.plan(config), ["xrandr", "--output", "VGA1", \
+        "--mode", "1024x768", "--pos", "3286x0", "--rotate", "normal", \
+        "--reflect", "normal"])
+
+  def test_off_before_on(self):
+    config = CONFIG.replace("output HDMI1\nmode 1920x1080\npos 1366x0\n" \
+        "rate 60.0\n", "output HDMI1\noff\n").replace("output VGA1\noff\n", \
+        "output VGA1\nmode 1920x1080\npos 1366x0\n")
+    launch = self.plan(config)
+    self.assertEqual(launch[:4], ["xrandr", "--output", "HDMI1", "--off"])
+    self.assertEqual(launch[4:6], ["--output", "VGA1"])
+
+  def test_move_primary(self):
+    config = CONFIG.replace("primary\n", "").replace("pos 1366x0\n", \
+        "pos 1366x0\nprimary\n")
+    self.assertEqual(self.plan(config), \
+        ["xrandr", "--output", "HDMI1", "--primary"])
+
+  def test_noprimary(self):
+    self.assertEqual(self.plan(CONFIG.replace("primary\n", "")), \
+        ["xrandr", "--noprimary"])
+
+  def test_rotate(self):
+    config = CONFIG.replace("pos 1366x0\n", "pos 1366x0\nrotate left\n")
+    self.assertEqual(self.plan(config), ["xrandr", "--output", "HDMI1", \
+        "--mode", "1920x1080", "--pos", "1366x0", "--rotate", "left", \
+        "--reflect", "normal", "--rate", "60.0"])
+
+  def test_rotated_state(self):
+    xrandr = XRANDR.replace("1920x1080+1366+0 (", "1920x1080+1366+0 left (")
+    self.assertEqual(planner.parsestate(xrandr)["HDMI1"]['rotate'], "left")
+    self.assertEqual(self.plan(CONFIG, xrandr)[5:8], \
+        ["--pos", "1366x0", "--rotate"])
+
+  def test_reflected_state(self):
+    xrandr = XRANDR.replace("1920x1080+1366+0 (", \
+        "1920x1080+1366+0 X axis (")
+    self.assertEqual(planner.parsestate(xrandr)["HDMI1"]['reflect'], "x")
+    launch = self.plan(CONFIG, xrandr)
+    self.assertEqual(launch[:3], ["xrandr", "--output", "HDMI1"])
+    self.assertEqual(launch[launch.index("--reflect") + 1], "normal")
+
+  def test_unmodelled_config(self):
+    self.assertEqual(self.config(CONFIG + "panning 3000x1080\n"), None)
+    self.assertEqual(self.config(CONFIG.replace("pos 0x0\n", \
+        "pos 0x0\nreflect x\n")), None)
+    self.assertEqual(self.config(CONFIG.replace("mode 1920x1080\n", "")), \
+        None)
+
+  def test_disper_config(self):
+    self.assertEqual(self.config("metamode: DFP-0: nvidia-auto-select " \
+        "@1920x1080 +0+0\n"), None)
+
+  def test_panning_state(self):
+    xrandr = XRANDR.replace("1920x1080+1366+0 (", \
+        "1920x1080+1366+0 panning 3000x1080+1366+0 (")
+    self.assertFalse(planner.complete(planner.parsestate(xrandr)))
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()
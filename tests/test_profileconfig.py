@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import profileconfig
+from profileconfig import Output
+
+class ProfileConfigTest(unittest.TestCase):
+  """ Parsing autorandr and auto-disper config files """
+
+  def setUp(self):
+    """ A directory for the config files """
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, content, name="config"):
+    """ Writes a config file and returns its name """
+    filename = os.path.join(self.tmpdir, name)
+    with open(filename, "w") as fp:
+      fp.write(content)
+    return filename
+
+  def test_xrandr(self):
+    filename = self.write("output LVDS1\nmode 1366x768\npos 0x0\n" \
+        "rate 60.0\nprimary\noutput HDMI1\noff\n")
+    self.assertEqual(profileconfig.configformat(filename), profileconfig.XRANDR)
+    self.assertEqual(profileconfig.parse(filename), (Output("LVDS1", \
+        "1366x768", "0x0", "60.0", primary=True), Output("HDMI1", off=True)))
+
+  def test_extra(self):
+    filename = self.write("output HDMI1\nmode 1920x1080\npos 0x0\n" \
+        "reflect x\npanning 3000x1080\n")
+    self.assertEqual(profileconfig.parse(filename)[0].extra, \
+        ("reflect", "panning"))
+
+  def test_metamode(self):
+    filename = self.write("metamode: DFP-0: nvidia-auto-select @1920x1080 " \
+        "+0+0, CRT-1: 1280x1024 @1280x1024 +1920+0\n")
+    self.assertEqual(profileconfig.configformat(filename), profileconfig.DISPER)
+    self.assertEqual(profileconfig.parse(filename), \
+        (Output("DFP-0", "1920x1080", "0x0"), \
+        Output("CRT-1", "1280x1024", "1920x0")))
+
+  def test_short_metamode(self):
+    self.assertEqual(list(profileconfig.parsemetamode("DFP-0: auto")), [])
+
+  def test_changed_file(self):
+    filename = self.write("output HDMI1\nmode 1920x1080\n")
+    self.assertEqual(profileconfig.parse(filename)[0].mode, "1920x1080")
+    os.unlink(filename)
+    filename = self.write("output HDMI1\nmode 1280x1024\n")
+    os.utime(filename, (1, 1))
+    self.assertEqual(profileconfig.parse(filename)[0].mode, "1280x1024")
+
+  def test_missing(self):
+    self.assertRaises(IOError, profileconfig.parse, \
+        os.path.join(self.tmpdir, "missing"))
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2012 Landeshauptstadt München
+# All rights reserved.
+#
+# Licensed under the EUPL, Version 1.0 only (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# http://joinup.ec.europa.eu/software/page/eupl
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the Licence for the specific language governing permissions and
+# limitations under the Licence.
+
+import os, sys, unittest, tempfile, shutil, time, threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    os.pardir, "autorandrgui"))
+import watcher, headless
+
+class WatcherTest(unittest.TestCase):
+  """ The changes reported for a profile directory watched with inotify """
+
+  def setUp(self):
+    """ A profile directory with one profile """
+    self.tmpdir = tempfile.mkdtemp()
+    self.ardir = os.path.join(self.tmpdir, "autorandr")
+    os.makedirs(os.path.join(self.ardir, "dock"))
+    self.changes = []
+    self.reported = threading.Event()
+    self.watcher = watcher.Watcher(self.ardir, self.ardir + ".conf", \
+        self.report, delay=0.05)
+    self.watcher.start()
+    if self.watcher.inotify is None:
+      self.watcher.stop()
+      self.skipTest("inotify is not available")
+
+  def tearDown(self):
+    self.watcher.stop()
+    shutil.rmtree(self.tmpdir)
+
+  def report(self, changes):
+    self.changes.extend(changes)
+    self.reported.set()
+
+  def wait(self):
+    """ Returns the next reported changes """
+    self.assertTrue(self.reported.wait(5))
+    time.sleep(0.1)
+    changes, self.changes = self.changes, []
+    self.reported.clear()
+    return changes
+
+  def test_rename(self):
+    os.rename(os.path.join(self.ardir, "dock"), \
+        os.path.join(self.ardir, "office"))
+    self.assertEqual(self.wait(), [(headless.PROFILE_RENAMED, "dock", \
+        "office")])
+    with open(os.path.join(self.ardir, "office", "config"), "w") as fp:
+      fp.write("output HDMI1\n")
+    self.assertEqual(self.wait(), [(headless.PROFILE_MODIFIED, "office")])
+
+  def test_move_away(self):
+    os.rename(os.path.join(self.ardir, "dock"), \
+        os.path.join(self.tmpdir, "dock"))
+    self.assertEqual(self.wait(), [(headless.PROFILE_DELETED, "dock")])
+
+""" Load main() """
+if __name__ == "__main__":
+  unittest.main()